@@ -5,6 +5,11 @@ import os
 import re
 import mimetypes
 import subprocess
+import json
+import time
+import uuid
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 # Add model directory to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'model')))
@@ -25,11 +30,16 @@ ssl._create_default_https_context = ssl._create_unverified_context
 import albumentations as A
 from albumentations.pytorch import ToTensorV2
 from albumentations.pytorch import ToTensorV2
-from src.models import DeepfakeDetector
+# Model backends (src.models, src.cascade, src.quantization, src.onnx_runtime) are imported
+# in load_model, so the ONNX Runtime path does not load torchvision or torch.ao
 from src.config import Config
 from checkers import metadata_checker
 from checkers import watermark_checker
 import database
+from batching import InferenceBatcher
+from result_cache import ResultCache, hash_file, checkpoint_fingerprint
+from jobs import JobManager
+from scan_context import ScanContext
 
 try:
     from safetensors.torch import load_file
@@ -43,6 +53,7 @@ CORS(app)
 # Configuration
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'mp4', 'avi', 'mov', 'webm'}
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.webm')
 HISTORY_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'history_uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(HISTORY_FOLDER, exist_ok=True)
@@ -51,10 +62,59 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # Increase to 500MB for video
 
+# Micro-batching: concurrent /api/predict requests are grouped into one forward pass.
+# Raise BATCH_MAX_WAIT_MS for throughput, lower it (or set BATCH_MAX_SIZE=1) for latency.
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 10))
+
+# Result cache: identical uploads (same bytes, checkpoint and parameters) skip the pipeline
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", 256))
+VIDEO_FRAMES_PER_SECOND = 20
+VIDEO_BATCH_SIZE = int(os.environ.get("VIDEO_BATCH_SIZE", 16))  # Sampled frames per forward pass
+# Staged decode / face-detect / inference / thumbnail pipeline (per-stage stats land in 'stage_stats')
+VIDEO_PIPELINE = os.environ.get("VIDEO_PIPELINE", "1") == "1"
+VIDEO_FACE_WORKERS = int(os.environ.get("VIDEO_FACE_WORKERS", 0)) or None
+# Face tracking: Haar detection on a downscaled frame at most every N samples, template tracking in between
+VIDEO_FACE_TRACKING = os.environ.get("VIDEO_FACE_TRACKING", "1") == "1"
+VIDEO_DETECT_EVERY = int(os.environ.get("VIDEO_DETECT_EVERY", 10))
+# Early termination: stop decoding once the video verdict is settled (can be forced per request with early_stop=1)
+VIDEO_EARLY_STOP = os.environ.get("VIDEO_EARLY_STOP", "0") == "1"
+# Frame source: "opencv" (full-resolution cv2 decode) or "ffmpeg" (fps + scale filters, raw frames over a pipe)
+VIDEO_FRAME_SOURCE = os.environ.get("VIDEO_FRAME_SOURCE", "opencv")
+VIDEO_DECODE_WIDTH = int(os.environ.get("VIDEO_DECODE_WIDTH", 640))
+# Suspicious-frame heatmaps from the forward-pass patch map (no Grad-CAM backward per frame)
+VIDEO_PATCH_MAPS = os.environ.get("VIDEO_PATCH_MAPS", "1") == "1"
+
+# Background video jobs (/api/video_jobs): worker pool size and how long finished jobs are kept
+VIDEO_JOB_WORKERS = int(os.environ.get("VIDEO_JOB_WORKERS", 2))
+VIDEO_JOB_TTL = int(os.environ.get("VIDEO_JOB_TTL", 3600))
+# Web-playback copies are made in the background, in parallel with analysis of the original upload
+TRANSCODE_WORKERS = int(os.environ.get("TRANSCODE_WORKERS", 2))
+# Metadata / watermark checks run on this pool while the model forward pass is in flight
+CHECK_WORKERS = int(os.environ.get("CHECK_WORKERS", 4))
+# Confidence-gated cascade: path to a head saved by model/calibrate_cascade.py (empty = always run the full model)
+CASCADE_HEAD = os.environ.get("CASCADE_HEAD", "")
+# INT8 CPU model written by model/quantize_model.py (*.int8.pth), served instead of the fp32 checkpoint
+INT8_MODEL = os.environ.get("INT8_MODEL", "")
+# ONNX model written by model/export_onnx.py, run with ONNX Runtime on CPU instead of eager PyTorch
+ONNX_MODEL = os.environ.get("ONNX_MODEL", "")
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", 0)) or None
+# Eager-model precision: fp32, bf16, channels_last or bf16+channels_last (check drift with model/check_precision_drift.py)
+INFERENCE_PRECISION = os.environ.get("INFERENCE_PRECISION", "fp32")
+
 # Global model and transform
 device = torch.device(Config.DEVICE)
 model = None
 transform = None
+batcher = None
+heatmap_batcher = None
+cascade = None
+model_fingerprint = None
+result_cache = ResultCache(capacity=RESULT_CACHE_SIZE)
+job_manager = JobManager(max_workers=VIDEO_JOB_WORKERS, ttl=VIDEO_JOB_TTL)
+transcode_pool = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix="transcode")
+check_pool = ThreadPoolExecutor(max_workers=CHECK_WORKERS, thread_name_prefix="image-check")
+pending_transcodes = {}  # history path -> web-copy future, while the copy is queued or running
 
 def get_transform():
     return A.Compose([
@@ -63,23 +123,61 @@ def get_transform():
         ToTensorV2(),
     ])
 
+def predict_batch(batch):
+    """
+    Run one batched forward pass and return (fake probability, patch map) for each sample.
+    The patch map (the "fast" heatmap) comes out of the same forward pass at negligible extra cost.
+    Under the cascade, samples answered by the light branches alone get no patch map.
+    """
+    with torch.inference_mode():
+        if cascade is not None:
+            logits, patch_logits, escalated = cascade.cascade_forward(batch.to(device), return_patch_map=True)
+        else:
+            logits, patch_logits = model(batch.to(device), return_patch_map=True)
+            escalated = None
+        probs = torch.sigmoid(logits).view(-1).tolist()
+        if patch_logits is None: # Patch branch disabled
+            return [(prob, None) for prob in probs]
+        maps = list(torch.sigmoid(patch_logits).float().cpu().numpy())
+        if escalated is not None:
+            maps = [m if e else None for m, e in zip(maps, escalated.tolist())]
+        return list(zip(probs, maps))
+
+def predict_batch_with_heatmap(batch):
+    """
+    Grad-CAM requests that arrive together share one forward and one backward pass.
+    Returns (fake probability, Grad-CAM heatmap) for each sample.
+    """
+    logits, heatmaps = model.predict_with_heatmap(batch.to(device))
+    probs = torch.sigmoid(logits).view(-1).tolist()
+    return list(zip(probs, heatmaps))
+
 def load_model():
     """Load the trained deepfake detection model"""
-    global model, transform
+    global model, transform, batcher, heatmap_batcher, cascade, model_fingerprint, device
     
     checkpoint_dir = Config.CHECKPOINT_DIR
     # Explicitly target the model requested by the user
     target_model_name = "algro_markv2.safetensors"
     checkpoint_path = os.path.join(checkpoint_dir, target_model_name)
+    serving_path = ONNX_MODEL or INT8_MODEL
+    if serving_path:
+        checkpoint_dir, target_model_name = os.path.split(serving_path)
+        checkpoint_path = serving_path
+        if device.type != "cpu":
+            print(f"ℹ️  {'ONNX' if ONNX_MODEL else 'INT8'} models run on CPU only; ignoring device '{device}'")
+            device = torch.device("cpu")
     
     print(f"Using device: {device}")
     
-    # Initialize with pretrained=True to ensure missing keys (frozen layers) have valid ImageNet weights
-    # instead of random noise. This fixes the "random prediction" issue when the checkpoint 
-    # only contains finetuned layers.
-    model = DeepfakeDetector(pretrained=True)
-    model.to(device)
-    model.eval()
+    if not serving_path:
+        # Initialize with pretrained=True to ensure missing keys (frozen layers) have valid ImageNet weights
+        # instead of random noise. This fixes the "random prediction" issue when the checkpoint 
+        # only contains finetuned layers.
+        from src.models import DeepfakeDetector
+        model = DeepfakeDetector(pretrained=True)
+        model.to(device)
+        model.eval()
     
     # Check if file exists first
     if not os.path.exists(checkpoint_path):
@@ -91,17 +189,44 @@ def load_model():
 
     try:
         print(f"Loading checkpoint: {checkpoint_path}")
-        if checkpoint_path.endswith(".safetensors") and SAFETENSORS_AVAILABLE:
-            state_dict = load_file(checkpoint_path)
+        if ONNX_MODEL:
+            # Branch dispatch, fusion and patch map all run inside one ONNX Runtime session
+            from src.onnx_runtime import OnnxDetector
+            model = OnnxDetector(checkpoint_path, threads=ONNX_THREADS)
+            missing_keys, unexpected_keys = [], []
+        elif INT8_MODEL:
+            # Complete quantized model (Grad-CAM requests fall back to the patch-map heatmap)
+            from src.quantization import load_quantized
+            model, _ = load_quantized(checkpoint_path)
+            missing_keys, unexpected_keys = [], []
         else:
-            state_dict = torch.load(checkpoint_path, map_location=device)
-            
-        # Use strict=False because the checkpoint might be a partial save (e.g. only finetuned layers)
-        # or there might be minor architecture mismatches.
-        # Since we use pretrained=True, the missing keys will remain as ImageNet weights (valid features).
-        missing_keys, unexpected_keys = model.load_state_dict(state_dict, strict=False)
+            if checkpoint_path.endswith(".safetensors") and SAFETENSORS_AVAILABLE:
+                state_dict = load_file(checkpoint_path)
+            else:
+                state_dict = torch.load(checkpoint_path, map_location=device)
+                
+            # Use strict=False because the checkpoint might be a partial save (e.g. only finetuned layers)
+            # or there might be minor architecture mismatches.
+            # Since we use pretrained=True, the missing keys will remain as ImageNet weights (valid features).
+            missing_keys, unexpected_keys = model.load_state_dict(state_dict, strict=False)
+            model.set_precision(INFERENCE_PRECISION)
+        # Branch subsets and precision modes give different scores from the same checkpoint
+        model_fingerprint = f"{checkpoint_fingerprint(checkpoint_path)}:{'+'.join(model.branch_names)}:{model.precision}"
+        if CASCADE_HEAD and ONNX_MODEL:
+            print("ℹ️  CASCADE_HEAD ignored: the cascade runs branches one by one, the ONNX graph runs them all")
+        elif CASCADE_HEAD:
+            # Early answers differ from the full model's, so the head and its band are part of the key
+            from src.cascade import load_cascade
+            cascade = load_cascade(model, CASCADE_HEAD, device)
+            model_fingerprint += f":cascade={checkpoint_fingerprint(CASCADE_HEAD)}"
         
         print(f"✅ Model loaded successfully!")
+        print(f"Branches: {', '.join(model.branch_names)}{' (INT8)' if model.quantized else ''}")
+        print(f"Precision: {model.precision}")
+        if model.parallel_branches:
+            print(f"Parallel branches: {model.branch_threads or torch.get_num_threads()} intra-op threads split between branches")
+        if cascade is not None:
+            print(f"Cascade: {CASCADE_HEAD} (uncertain band [{cascade.low:.3f}, {cascade.high:.3f}])")
         if missing_keys:
             print(f"ℹ️  {len(missing_keys)} keys missing from checkpoint (using pretrained defaults).")
         if unexpected_keys:
@@ -113,53 +238,116 @@ def load_model():
         model = None
     
     transform = get_transform()
+    if model is not None:
+        batcher = InferenceBatcher(predict_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+        heatmap_batcher = InferenceBatcher(predict_batch_with_heatmap, max_batch_size=BATCH_MAX_SIZE,
+                                           max_wait_ms=BATCH_MAX_WAIT_MS, name="heatmap-batcher")
+        print(f"Batching up to {BATCH_MAX_SIZE} images, waiting at most {BATCH_MAX_WAIT_MS}ms")
     return model, transform
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def predict_image(image_path):
-    """Make prediction on a single image"""
+def parse_heatmap_mode(value):
+    """
+    Interpret the optional 'heatmap' form field.
+    "fast"/"patch" -> forward-only patch map, "0"/"false"/"none"/... -> no heatmap,
+    anything else (default) -> Grad-CAM.
+    """
+    value = str(value).strip().lower()
+    if value in ('fast', 'patch'):
+        return 'fast'
+    if value in ('0', 'false', 'no', 'off', 'none'):
+        return None
+    return 'gradcam'
+
+def render_heatmap(heatmap, image_bgr):
+    """Colour a [0, 1] heatmap of any resolution, blend it over the image and return it as base64 JPEG"""
+    # Resize to original image size
+    heatmap = cv2.resize(heatmap.astype(np.float32), (image_bgr.shape[1], image_bgr.shape[0]))
+    heatmap = np.uint8(255 * np.clip(heatmap, 0, 1))
+    heatmap = cv2.applyColorMap(heatmap, cv2.COLORMAP_JET)
+    
+    # Superimpose
+    # Heatmap is BGR (from cv2), so blend it with the BGR pixels
+    superimposed_img = heatmap * 0.4 + image_bgr * 0.6
+    superimposed_img = np.clip(superimposed_img, 0, 255).astype(np.uint8)
+    
+    # Encode to Base64
+    _, buffer = cv2.imencode('.jpg', superimposed_img)
+    return base64.b64encode(buffer).decode('utf-8')
+
+def is_known_generator_filename(filename):
+    """Filenames that are flagged as FAKE regardless of the model output"""
+    filename_lower = os.path.basename(filename).lower()
+    return "chatgpt" in filename_lower or "gemini" in filename_lower
+
+def timed_call(fn, *args, **kwargs):
+    """Run fn and return (result, elapsed seconds); used to time work done on the check pool"""
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+def predict_image(image_path, heatmap_mode='gradcam', context=None):
+    """
+    Make prediction on a single image
+
+    Args:
+        image_path (str): Image file (used for the filename check, and read if no context is given)
+        heatmap_mode (str): 'gradcam' (needs a backward pass), 'fast' (patch map from the forward
+                            pass, shares micro-batches with other requests) or None
+        context (ScanContext): Bytes and decoded pixels shared by the model and the checkers
+    """
     if model is None:
         return None, "Error: Model not loaded. Check backend logs for 'best_model.safetensors' error."
 
+    timings = {}
+    started = time.perf_counter()
     try:
-        # Read and preprocess image
-        image = cv2.imread(image_path)
+        context = context or ScanContext.from_path(image_path)
+
+        # 0. Metadata & Watermark Checks: started now, joined after the model has finished.
+        # They are mostly native code (container parsing, c2pa, DWT) and overlap with inference.
+        meta_future = check_pool.submit(timed_call, metadata_checker.check_metadata, image_path, context=context)
+        water_future = check_pool.submit(timed_call, watermark_checker.check_watermarks, image_path, context=context)
+
+        # Read and preprocess image (decoded once, shared with the checkers)
+        stage_start = time.perf_counter()
+        image = context.rgb
         if image is None:
             return None, "Error: Could not read image"
         
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         augmented = transform(image=image)
-        image_tensor = augmented['image'].unsqueeze(0).to(device)
-        
-        
-        # 0. Metadata & Watermark Checks
-        meta_result = metadata_checker.check_metadata(image_path)
-        water_result = watermark_checker.check_watermarks(image_path)
-        
-        # Make prediction
-        logits = model(image_tensor)
-        prob = torch.sigmoid(logits).item()
-        
-        # Generate Heatmap
-        heatmap = model.get_heatmap(image_tensor)
-        
-        # Process Heatmap for Visualization
-        # Resize to original image size
-        heatmap = cv2.resize(heatmap, (image.shape[1], image.shape[0]))
-        heatmap = np.uint8(255 * heatmap)
-        heatmap = cv2.applyColorMap(heatmap, cv2.COLORMAP_JET)
-        
-        # Superimpose
-        # Heatmap is BGR (from cv2), Image is RGB. Convert Image to BGR.
-        image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        superimposed_img = heatmap * 0.4 + image_bgr * 0.6
-        superimposed_img = np.clip(superimposed_img, 0, 255).astype(np.uint8)
-        
-        # Encode to Base64
-        _, buffer = cv2.imencode('.jpg', superimposed_img)
-        heatmap_b64 = base64.b64encode(buffer).decode('utf-8')
+        timings['preprocess'] = time.perf_counter() - stage_start
+        
+        heatmap = None
+        heatmap_b64 = None
+        stage_start = time.perf_counter()
+        if heatmap_mode == 'gradcam' and not model.supports_gradcam:
+            heatmap_mode = 'fast' # Grad-CAM explains the RGB branch; use the patch map without it
+        if heatmap_mode == 'gradcam':
+            # Prediction and Grad-CAM from a single forward pass, batched with concurrent Grad-CAM requests
+            prob, heatmap = heatmap_batcher.submit(augmented['image']).result()
+        else:
+            # No backward pass: queued so concurrent requests share one forward pass,
+            # which also yields the patch map used by the fast heatmap
+            prob, heatmap = batcher.submit(augmented['image']).result()
+            if heatmap_mode != 'fast':
+                heatmap = None
+        timings['inference'] = time.perf_counter() - stage_start
+        
+        if heatmap is not None:
+            # Process Heatmap for Visualization
+            stage_start = time.perf_counter()
+            heatmap_b64 = render_heatmap(heatmap, context.bgr)
+            timings['heatmap_render'] = time.perf_counter() - stage_start
+        
+        # Join the checks; 'checks_wait' is the part of their cost that inference did not hide
+        stage_start = time.perf_counter()
+        meta_result, timings['metadata_check'] = meta_future.result()
+        water_result, timings['watermark_check'] = water_future.result()
+        timings['checks_wait'] = time.perf_counter() - stage_start
+        timings['total'] = time.perf_counter() - started
         
         is_fake = prob > 0.5
         
@@ -172,8 +360,7 @@ def predict_image(image_path):
             prob = max(prob, 0.99) 
             
         # Hidden Check: Explicitly flag known generator filenames as FAKE without frontend badging
-        filename_lower = os.path.basename(image_path).lower()
-        if "chatgpt" in filename_lower or "gemini" in filename_lower:
+        if is_known_generator_filename(image_path):
             is_fake = True
             prob = max(prob, 0.998) # Extremely high confidence
             # Intentionally NOT adding to meta_result or water_result to keep it hidden from badges
@@ -188,8 +375,10 @@ def predict_image(image_path):
             'fake_probability': float(prob),
             'real_probability': float(1 - prob),
             'heatmap': heatmap_b64,
+            'heatmap_mode': heatmap_mode if heatmap_b64 is not None else None,
             'metadata_check': meta_result,
-            'watermark_check': water_result
+            'watermark_check': water_result,
+            'timings_ms': {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
         }, None
     except Exception as e:
         return None, str(e)
@@ -210,7 +399,7 @@ def serve_history_image(filename):
         return jsonify({'error': 'File not found'}), 404
 
     # Handle Video Range Requests
-    if filename.lower().endswith(('.mp4', '.mov', '.avi', '.webm')):
+    if filename.lower().endswith(VIDEO_EXTENSIONS):
         file_size = os.path.getsize(file_path)
         range_header = request.headers.get('Range', None)
         
@@ -259,49 +448,110 @@ def serve_history_image(filename):
     response = send_from_directory(HISTORY_FOLDER, filename)
     return response
 
-def reencode_video(input_path):
-    """Re-encode video to H.264/AAC with faststart using ffmpeg"""
+def probe_video(input_path):
+    """Container and codec info from ffprobe (None if ffprobe is unavailable or fails)"""
+    try:
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-show_entries', 'stream=codec_type,codec_name,pix_fmt',
+            '-of', 'json',
+            input_path
+        ]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30)
+        if result.returncode != 0:
+            return None
+        info = json.loads(result.stdout.decode() or '{}')
+        video = [st for st in info.get('streams', []) if st.get('codec_type') == 'video']
+        audio = [st for st in info.get('streams', []) if st.get('codec_type') == 'audio']
+        return {
+            'video_codec': video[0].get('codec_name') if video else None,
+            'pix_fmt': video[0].get('pix_fmt') if video else None,
+            'audio_codecs': [st.get('codec_name') for st in audio]
+        }
+    except Exception as e:
+        print(f"ffprobe failed: {e}")
+        return None
+
+def is_web_compatible(probe):
+    """H.264 (yuv420p) video with AAC or no audio only needs a remux, not a transcode"""
+    return (
+        probe is not None
+        and probe['video_codec'] == 'h264'
+        and probe['pix_fmt'] in ('yuv420p', 'yuvj420p')
+        and all(codec == 'aac' for codec in probe['audio_codecs'])
+    )
+
+def reencode_video(input_path, output_path=None):
+    """
+    Make a web-playable H.264/AAC copy with faststart using ffmpeg.
+    Files that already are H.264/AAC are only remuxed (stream copy); everything else is transcoded.
+    Writes to output_path (or replaces input_path when not given). Falls back to a plain copy on failure.
+    """
+    in_place = output_path is None
+    final_path = input_path if in_place else output_path
+    temp_path = final_path + "_temp.mp4"
     try:
-        output_path = input_path + "_temp.mp4"
-        print(f"🔄 Re-encoding video: {input_path}")
+        probe = probe_video(input_path)
+        if is_web_compatible(probe):
+            print(f"🔄 Remuxing web-compatible video: {input_path}")
+            # -c copy: keep the H.264/AAC streams as they are, only rewrite the container
+            codec_args = ['-c', 'copy']
+        else:
+            print(f"🔄 Re-encoding video: {input_path}")
+            # -c:v libx264: use H.264 video codec
+            # -preset fast: encode speed
+            # -pix_fmt yuv420p: ensure wide player compatibility (essential for QuickTime/Safari)
+            # -c:a aac: use AAC audio codec
+            codec_args = ['-c:v', 'libx264', '-preset', 'fast', '-pix_fmt', 'yuv420p', '-c:a', 'aac']
         
         # FFmpeg command
         # -y: overwrite output
-        # -c:v libx264: use H.264 video codec
-        # -preset fast: encode speed
-        # -profile:v high: high profile for better compatibility
-        # -level 4.0: compatibility level
-        # -pix_fmt yuv420p: ensure wide player compatibility (essential for QuickTime/Safari)
-        # -c:a aac: use AAC audio codec
         # -movflags +faststart: move metadata to front for streaming
-        cmd = [
-            'ffmpeg', '-y', 
-            '-i', input_path,
-            '-c:v', 'libx264',
-            '-preset', 'fast',
-            '-pix_fmt', 'yuv420p',
-            '-c:a', 'aac',
-            '-movflags', '+faststart',
-            output_path
-        ]
+        cmd = ['ffmpeg', '-y', '-i', input_path] + codec_args + ['-movflags', '+faststart', temp_path]
         
         # Run ffmpeg
         result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         
         if result.returncode != 0:
             print(f"❌ FFmpeg re-encoding failed: {result.stderr.decode()}")
-            return input_path # Fallback to original
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if not in_place:
+                shutil.copy(input_path, final_path)
+            return final_path # Fallback to original
             
         print(f"✅ Video re-encoded successfully!")
         
-        # Replace original
-        os.remove(input_path)
-        os.rename(output_path, input_path)
-        return input_path
+        # Atomic replace, so a half-written file is never served
+        os.replace(temp_path, final_path)
+        return final_path
         
     except Exception as e:
         print(f"❌ Error during re-encoding: {e}")
-        return input_path
+        if not in_place and not os.path.exists(final_path):
+            shutil.copy(input_path, final_path)
+        return final_path
+
+def remove_upload(filepath):
+    try:
+        os.remove(filepath)
+    except:
+        pass
+
+def discard_history_video(history_path):
+    """
+    Delete a web-playback copy no history row refers to. A copy still queued is cancelled;
+    one being written is deleted (with its temp file) once ffmpeg is done with it.
+    """
+    def remove(_=None):
+        remove_upload(history_path)
+        remove_upload(history_path + "_temp.mp4")
+    
+    transcode = pending_transcodes.get(history_path)
+    if transcode is not None and not transcode.cancel():
+        transcode.add_done_callback(remove)
+    else:
+        remove()
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -309,7 +559,12 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'model_loaded': model is not None,
-        'device': str(device)
+        'device': str(device),
+        'batching': batcher.stats() if batcher is not None else None,
+        'heatmap_batching': heatmap_batcher.stats() if heatmap_batcher is not None else None,
+        'cascade': cascade.stats() if cascade is not None else None,
+        'result_cache': result_cache.stats(),
+        'watermark_prefilter': watermark_checker.watermark_stats()
     })
 
 @app.route('/api/predict', methods=['POST'])
@@ -328,23 +583,34 @@ def predict():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg, webp'}), 400
         
-        # Save file
+        # Read the upload once; hashing, decoding and all checks share these bytes
         filename = secure_filename(file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        context = ScanContext(file.read(), filename)
         
-        # Make prediction
-        result, error = predict_image(filepath)
+        # Make prediction (clients may send heatmap=fast for the cheap patch map, or heatmap=0 to skip it)
+        heatmap_mode = parse_heatmap_mode(request.form.get('heatmap', 'gradcam'))
+        cache_key = result_cache.make_key(
+            context.sha256, model_fingerprint,
+            kind='image', heatmap=heatmap_mode, generator_name=is_known_generator_filename(filename)
+        )
+        result = result_cache.get(cache_key)
+        if result is not None:
+            result['cached'] = True
+            result.pop('timings_ms', None)  # Timings belong to the original scan
+        else:
+            result, error = predict_image(filepath, heatmap_mode=heatmap_mode, context=context)
+            if result is not None:
+                result_cache.put(cache_key, result)
+                result['cached'] = False
         
         # Save to History
-        import shutil
         history_filename = f"scan_{int(datetime.datetime.now().timestamp())}_{filename}"
         history_path = os.path.join(HISTORY_FOLDER, history_filename)
         
-        # Copy original file to history folder
-        # We need to read the file again or just copy if we haven't deleted it?
-        # We read via cv2, the file is still at filepath.
-        shutil.copy(filepath, history_path)
+        # Write the original bytes straight to the history folder (no temporary upload file)
+        with open(history_path, 'wb') as f:
+            f.write(context.data)
         
         # Relative path for frontend
         relative_path = f"history_uploads/{history_filename}"
@@ -358,65 +624,81 @@ def predict():
             image_path=relative_path
         )
         
-        # Clean up uploaded file
-        try:
-            os.remove(filepath)
-        except:
-            pass
-        
         return jsonify(result)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/predict_video', methods=['POST'])
-def predict_video():
-    """Handle video upload and prediction"""
+def run_video_scan(filepath, filename, progress_callback=None, cancel_event=None, early_stop=VIDEO_EARLY_STOP):
+    """
+    Full video pipeline for an uploaded file: cache lookup, analysis, web-playback copy and history.
+    Shared by the blocking /api/predict_video endpoint and the background job API.
+    The analysis reads the original upload while the web copy is remuxed/transcoded in
+    the background; the returned video_url becomes playable when that copy is finished.
+    Returns the result dict, or a dict with an "error" key.
+    """
+    transcode = None
+    history_path = None
+    persisted = False
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-            
-        if not allowed_file(file.filename):
-             return jsonify({'error': 'Invalid file type'}), 400
-             
-        # Save file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Re-encode video for proper web playback
-        filepath = reencode_video(filepath)
-        
-        # Process Video
-        # Note: process_video needs sys.path to be correct to import models inside it if it was standalone,
-        # but here we pass the already loaded 'model' object.
         if model is None:
-             return jsonify({'error': 'Model not loaded'}), 500
-             
-        result = video_inference.process_video(filepath, model, transform, device, frames_per_second=20)
-        
-        if "error" in result:
-             return jsonify(result), 500
-             
-        # Save to History (Using the first frame or a placeholder icon for now?)
-        # For video, we might want to save the video file itself to history_uploads
-        # or just a thumbnail. Let's save the video for now.
-        import shutil
-        history_filename = f"scan_{int(datetime.datetime.now().timestamp())}_{filename}"
-        history_path = os.path.join(HISTORY_FOLDER, history_filename)
-        shutil.copy(filepath, history_path)
-        
-        relative_path = f"history_uploads/{history_filename}"
+            return {'error': 'Model not loaded'}
+        
+        # Hash the upload as received (before re-encoding) for the result cache
+        cache_key = result_cache.make_key(
+            hash_file(filepath), model_fingerprint,
+            kind='video', frames_per_second=VIDEO_FRAMES_PER_SECOND, early_stop=early_stop,
+            frame_source=VIDEO_FRAME_SOURCE, decode_width=VIDEO_DECODE_WIDTH, patch_maps=VIDEO_PATCH_MAPS,
+            face_tracking=VIDEO_FACE_TRACKING, detect_every=VIDEO_DETECT_EVERY
+        )
+        result = result_cache.get(cache_key)
+        cached_video = None
+        if result is not None and result.get('video_url'):
+            cached_video = os.path.join(HISTORY_FOLDER, os.path.basename(result['video_url']))
+        
+        if cached_video is not None and os.path.exists(cached_video):
+            # Cache hit: reuse the verdict and the web-playable copy saved on the first scan
+            result['cached'] = True
+            relative_path = result['video_url']
+        else:
+            # Save to History (Using the first frame or a placeholder icon for now?)
+            # For video, we might want to save the video file itself to history_uploads
+            # or just a thumbnail. Let's save the video for now.
+            history_filename = f"scan_{int(datetime.datetime.now().timestamp())}_{filename}"
+            history_path = os.path.join(HISTORY_FOLDER, history_filename)
+            relative_path = f"history_uploads/{history_filename}"
+            
+            # Web-playback copy (remux or transcode) runs in the background while the original is analysed
+            transcode = transcode_pool.submit(reencode_video, filepath, history_path)
+            pending_transcodes[history_path] = transcode
+            transcode.add_done_callback(lambda _, path=history_path: pending_transcodes.pop(path, None))
+            
+            # Process Video
+            # Note: process_video needs sys.path to be correct to import models inside it if it was standalone,
+            # but here we pass the already loaded 'model' object.
+            if result is None:
+                result = video_inference.process_video(
+                    filepath, cascade or model, transform, device, frames_per_second=VIDEO_FRAMES_PER_SECOND,
+                    progress_callback=progress_callback, cancel_event=cancel_event, batch_size=VIDEO_BATCH_SIZE,
+                    pipelined=VIDEO_PIPELINE, face_workers=VIDEO_FACE_WORKERS,
+                    face_tracking=VIDEO_FACE_TRACKING, detect_every=VIDEO_DETECT_EVERY,
+                    early_stop=early_stop, frame_source=VIDEO_FRAME_SOURCE, decode_width=VIDEO_DECODE_WIDTH,
+                    patch_maps=VIDEO_PATCH_MAPS
+                )
+                
+                if "error" in result:
+                    return result # The web copy is discarded below
+                result['cached'] = False
+            else:
+                result['cached'] = True
+            
+            result['video_url'] = relative_path
+            result_cache.put(cache_key, {k: v for k, v in result.items() if k != 'cached'})
         
         # Add to database
         # Note: The database 'add_scan' might expect image-specific fields.
         # We'll re-use 'fake_prob' as 'avg_fake_prob'
-        database.add_scan(
+        persisted = database.add_scan(
             filename=filename,
             prediction=result['prediction'],
             confidence=result['confidence'],
@@ -424,22 +706,151 @@ def predict_video():
             real_prob=1 - result['avg_fake_prob'],
             image_path=relative_path 
         )
+        # The web copy may still be written; the player polls /api/video_status until it is
+        result['video_ready'] = transcode is None or transcode.done()
+        return result
+
+    except Exception as e:
+        print(f"Video Error: {e}")
+        return {'error': str(e)}
+    
+    finally:
+        # Clean up (once both the analysis and the web-playback copy are done with the upload)
+        if transcode is not None:
+            transcode.add_done_callback(lambda _: remove_upload(filepath))
+            if not persisted:
+                # Failed or cancelled scan: no history row will ever point at the web copy
+                discard_history_video(history_path)
+        else:
+            remove_upload(filepath)
+
+def parse_early_stop_flag():
+    """Optional 'early_stop' form field, defaulting to VIDEO_EARLY_STOP"""
+    value = request.form.get('early_stop')
+    if value is None:
+        return VIDEO_EARLY_STOP
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def save_video_upload(prefix=''):
+    """Validate and save the uploaded video. Returns (filepath, filename, error_response)"""
+    if 'file' not in request.files:
+        return None, None, (jsonify({'error': 'No file provided'}), 400)
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return None, None, (jsonify({'error': 'No file selected'}), 400)
+        
+    if not allowed_file(file.filename):
+        return None, None, (jsonify({'error': 'Invalid file type'}), 400)
+         
+    # Save file
+    filename = secure_filename(file.filename)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], prefix + filename)
+    file.save(filepath)
+    return filepath, filename, None
+
+@app.route('/api/predict_video', methods=['POST'])
+def predict_video():
+    """Handle video upload and prediction"""
+    try:
+        filepath, filename, error_response = save_video_upload()
+        if error_response:
+            return error_response
         
-        # Clean up
-        try:
-            os.remove(filepath)
-        except:
-            pass
-            
-        # Add video URL for frontend playback
-        result['video_url'] = relative_path
-        
+        result = run_video_scan(filepath, filename, early_stop=parse_early_stop_flag())
+        if "error" in result:
+            return jsonify(result), 500
         return jsonify(result)
 
     except Exception as e:
         print(f"Video Error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/video_jobs', methods=['POST'])
+def submit_video_job():
+    """Queue a video scan on the worker pool and return its job id immediately"""
+    try:
+        # Unique prefix so concurrent jobs with the same filename don't overwrite each other
+        filepath, filename, error_response = save_video_upload(prefix=f"job_{uuid.uuid4().hex[:8]}_")
+        if error_response:
+            return error_response
+        
+        if model is None:
+            os.remove(filepath)
+            return jsonify({'error': 'Model not loaded'}), 500
+        
+        early_stop = parse_early_stop_flag()
+        
+        def work(job):
+            return run_video_scan(
+                filepath, filename,
+                progress_callback=lambda info: job.publish({'event': 'progress', **info}),
+                cancel_event=job.cancel_event,
+                early_stop=early_stop
+            )
+        
+        # run_video_scan deletes the upload; a job cancelled while queued never gets there
+        job = job_manager.submit(filename, work, discard=lambda job: remove_upload(filepath))
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f"/api/video_jobs/{job.id}",
+            'stream_url': f"/api/video_jobs/{job.id}/stream"
+        }), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/video_status/<path:filename>', methods=['GET'])
+def video_status(filename):
+    """Whether the web-playback copy of a scanned video can be played yet"""
+    history_path = os.path.join(HISTORY_FOLDER, os.path.basename(filename))
+    pending = history_path in pending_transcodes
+    return jsonify({
+        'ready': not pending and os.path.exists(history_path),
+        'pending': pending
+    })
+
+@app.route('/api/video_jobs/<job_id>', methods=['GET'])
+def video_job_status(job_id):
+    """Current status, latest progress and (when done) the result of a video job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/video_jobs/<job_id>/stream', methods=['GET'])
+def video_job_stream(job_id):
+    """Server-Sent Events stream of per-frame progress and status changes for a video job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        sent = 0
+        while True:
+            events, sent, finished = job.wait_for_events(sent)
+            for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+            if finished and not events:
+                break
+            if not events:
+                yield ": keep-alive\n\n"
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/video_jobs/<job_id>', methods=['DELETE'])
+def cancel_video_job(job_id):
+    """Cancel a queued or running video job (decoding stops at the next frame)"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job.id, 'status': job.status, 'message': 'Cancellation requested'})
+
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
@@ -450,8 +861,13 @@ def get_history():
 
 @app.route('/api/history/<int:scan_id>', methods=['DELETE'])
 def delete_scan(scan_id):
-    """Delete a specific scan"""
+    """Delete a specific scan, and its video web copy once no other scan refers to it"""
+    image_path = database.get_scan_path(scan_id)
     if database.delete_scan(scan_id):
+        # Only video copies are removed; saved images stay on disk as before
+        if (image_path and image_path.lower().endswith(VIDEO_EXTENSIONS)
+                and database.count_scans_with_path(image_path) == 0):
+            discard_history_video(os.path.join(HISTORY_FOLDER, os.path.basename(image_path)))
         return jsonify({'message': 'Scan deleted'})
     return jsonify({'error': 'Failed to delete scan'}), 500
 
@@ -0,0 +1,105 @@
+import threading
+import queue
+import time
+from concurrent.futures import Future
+
+import torch
+
+
+class InferenceBatcher:
+    """
+    Dynamic micro-batching queue for model inference.
+
+    Concurrent requests call submit() with a single preprocessed image tensor
+    (C, H, W). A background worker collects requests until either
+    `max_batch_size` images are waiting or `max_wait_ms` has passed since the
+    first one arrived, runs one batched call and fans the per-sample results
+    back to the waiting futures.
+
+    Args:
+        run_batch (callable): Takes a (B, C, H, W) tensor, returns a list of B results.
+        max_batch_size (int): Upper bound on images per forward pass.
+        max_wait_ms (float): How long the first request in a batch may wait for company.
+        name (str): Worker thread name.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10, name="inference-batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, tensor):
+        """Queue one (C, H, W) tensor. Returns a Future resolving to its result."""
+        future = Future()
+        self._queue.put((tensor, future))
+        return future
+
+    def stop(self):
+        self._stop.set()
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'items': self._items,
+                'avg_batch_size': (self._items / self._batches) if self._batches else 0.0
+            }
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or the deadline passes."""
+        first = self._queue.get()
+        if first is None:
+            return []
+
+        pending = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stop.set()
+                break
+            pending.append(item)
+        return pending
+
+    def _worker(self):
+        while not self._stop.is_set():
+            pending = self._collect()
+            if not pending:
+                continue
+
+            # Drop requests whose caller already gave up
+            pending = [(t, f) for t, f in pending if f.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+
+            try:
+                batch = torch.stack([t for t, _ in pending])
+                results = self.run_batch(batch)
+                for (_, future), res in zip(pending, results):
+                    future.set_result(res)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(pending)
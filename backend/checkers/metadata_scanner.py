@@ -0,0 +1,263 @@
+import struct
+import zlib
+
+# exifread-style names of the only EXIF tags the checkers look at
+IFD0_TAGS = {0x010E: 'Image ImageDescription', 0x010F: 'Image Make', 0x0110: 'Image Model', 0x0131: 'Image Software'}
+EXIF_IFD_TAGS = {0x9286: 'EXIF UserComment'}
+EXIF_IFD_POINTER = 0x8769
+
+# Bytes per value of each TIFF field type
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+XMP_JPEG_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+MAX_TEXT_CHUNK = 1024 * 1024  # Same cap PIL applies to decompressed PNG text
+
+
+class ImageMetadata:
+    """
+    Metadata found by scan_metadata.
+
+    Attributes:
+        format (str): 'jpeg', 'png', 'webp' or None if the container was not recognised
+        exif (dict): exifread-style tag name -> printable value (only the tags in IFD0_TAGS / EXIF_IFD_TAGS)
+        text (list): Strings PIL would expose in Image.info (text chunks, and binary
+            segments such as EXIF, XMP and ICC decoded as latin-1)
+        c2pa (bool): An embedded C2PA / JUMBF manifest store is present
+        xmp (bytes): Raw XMP packet, if any
+        width, height (int): Image size from the frame header, or None
+    """
+
+    def __init__(self, format=None):
+        self.format = format
+        self.width = None
+        self.height = None
+        self.exif = {}
+        self.text = []
+        self.c2pa = False
+        self.xmp = b''
+
+    @property
+    def has_c2pa_reference(self):
+        """Embedded manifest, or an XMP pointer to a remote one"""
+        return self.c2pa or b'dcterms:provenance' in self.xmp
+
+    @property
+    def has_camera_exif(self):
+        """EXIF names the camera that took the picture"""
+        return bool(self.exif.get('Image Make') or self.exif.get('Image Model'))
+
+    def search_text(self):
+        return " ".join(self.text).lower()
+
+
+def scan_metadata(data):
+    """
+    Single pass over the container structure of an image, without decoding pixels.
+
+    Only segment headers are walked: JPEG markers up to the start of scan, PNG chunks and
+    WebP RIFF chunks. Pixel data (IDAT, VP8/VP8L) is jumped over by its length and never
+    read, but chunks stored after it (PNG text chunks, WebP EXIF/XMP) are still found.
+
+    Args:
+        data (bytes): Whole file contents
+
+    Returns:
+        ImageMetadata
+    """
+    view = memoryview(data)
+    try:
+        if view[:2] == b'\xff\xd8':
+            return _scan_jpeg(view)
+        if view[:8] == PNG_SIGNATURE:
+            return _scan_png(view)
+        if view[:4] == b'RIFF' and view[8:12] == b'WEBP':
+            return _scan_webp(view)
+    except (struct.error, ValueError, IndexError):
+        pass
+    return ImageMetadata()
+
+
+def _scan_jpeg(view):
+    meta = ImageMetadata('jpeg')
+    icc = []
+    pos = 2
+    try:
+        while pos + 4 <= len(view):
+            if view[pos] != 0xFF:
+                break
+            marker = view[pos + 1]
+            if marker == 0xFF:  # Fill byte
+                pos += 1
+                continue
+            if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # No payload
+                pos += 2
+                continue
+            if marker in (0xD9, 0xDA):  # End of image / start of scan: pixel data follows
+                break
+
+            length = struct.unpack_from('>H', view, pos + 2)[0]
+            segment = view[pos + 4:pos + 2 + length]
+            pos += 2 + length
+
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):  # Start of frame
+                meta.height, meta.width = struct.unpack_from('>HH', segment, 1)
+            elif marker == 0xE1:
+                if segment[:6] == b'Exif\x00\x00' and not meta.exif:
+                    meta.exif = _parse_exif(segment[6:])
+                    meta.text.append(_latin1(segment))
+                elif segment[:len(XMP_JPEG_HEADER)] == XMP_JPEG_HEADER:
+                    meta.xmp = bytes(segment[len(XMP_JPEG_HEADER):])
+                    meta.text.append(_latin1(meta.xmp))
+            elif marker == 0xE2 and segment[:12] == b'ICC_PROFILE\x00':
+                icc.append(segment[14:])
+            elif marker == 0xEB and segment[:2] == b'JP':  # APP11 JUMBF
+                meta.c2pa = meta.c2pa or _is_c2pa_jumbf(segment)
+            elif marker in (0xED, 0xFE):  # APP13 Photoshop/IPTC, comment
+                meta.text.append(_latin1(segment))
+    finally:
+        if icc:
+            meta.text.append("".join(_latin1(chunk) for chunk in icc))
+    return meta
+
+
+def _scan_png(view):
+    meta = ImageMetadata('png')
+    pos = 8
+    while pos + 8 <= len(view):
+        length, ctype = struct.unpack_from('>I4s', view, pos)
+        chunk = view[pos + 8:pos + 8 + length]
+        pos += 12 + length  # Length, type, data, CRC (IDAT is skipped here, never read)
+
+        if ctype == b'IEND':
+            break
+        try:
+            if ctype == b'IHDR':
+                meta.width, meta.height = struct.unpack_from('>II', chunk)
+            elif ctype == b'tEXt':
+                _, value = bytes(chunk).split(b'\x00', 1)
+                meta.text.append(value.decode('latin-1'))
+            elif ctype == b'zTXt':
+                _, rest = bytes(chunk).split(b'\x00', 1)
+                meta.text.append(_inflate(rest[1:]).decode('latin-1'))
+            elif ctype == b'iTXt':
+                key, rest = bytes(chunk).split(b'\x00', 1)
+                compressed = rest[0]
+                _, _, value = rest[2:].split(b'\x00', 2)
+                if compressed:
+                    value = _inflate(value)
+                if key == b'XML:com.adobe.xmp':
+                    meta.xmp = value
+                meta.text.append(value.decode('utf-8', errors='replace'))
+            elif ctype == b'eXIf':
+                meta.exif = _parse_exif(chunk)
+                meta.text.append(_latin1(chunk))
+            elif ctype == b'iCCP':
+                _, rest = bytes(chunk).split(b'\x00', 1)
+                meta.text.append(_latin1(_inflate(rest[1:])))
+            elif ctype == b'caBX':
+                meta.c2pa = True
+        except (ValueError, IndexError, zlib.error):
+            continue  # Malformed chunk: PIL skips it as well
+    return meta
+
+
+def _scan_webp(view):
+    meta = ImageMetadata('webp')
+    pos = 12
+    end = min(len(view), 8 + struct.unpack_from('<I', view, 4)[0])
+    while pos + 8 <= end:
+        fourcc, length = struct.unpack_from('<4sI', view, pos)
+        chunk = view[pos + 8:pos + 8 + length]
+        pos += 8 + length + (length & 1)  # Chunks are padded to an even size
+
+        if fourcc == b'VP8X':
+            meta.width = 1 + int.from_bytes(chunk[4:7], 'little')
+            meta.height = 1 + int.from_bytes(chunk[7:10], 'little')
+        elif fourcc == b'VP8 ' and meta.width is None:
+            meta.width, meta.height = (v & 0x3FFF for v in struct.unpack_from('<HH', chunk, 6))
+        elif fourcc == b'VP8L' and meta.width is None:
+            bits = struct.unpack_from('<I', chunk, 1)[0]
+            meta.width, meta.height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        elif fourcc == b'EXIF':
+            tiff = chunk[6:] if chunk[:6] == b'Exif\x00\x00' else chunk
+            meta.exif = _parse_exif(tiff)
+            meta.text.append(_latin1(chunk))
+        elif fourcc == b'XMP ':
+            meta.xmp = bytes(chunk)
+            meta.text.append(_latin1(chunk))
+        elif fourcc == b'ICCP':
+            meta.text.append(_latin1(chunk))
+        elif fourcc == b'C2PA':
+            meta.c2pa = True
+    return meta
+
+
+def _parse_exif(tiff):
+    """
+    Read the ImageDescription / Software / UserComment tags from a TIFF-structured EXIF block.
+    Values are formatted the way exifread prints them.
+    """
+    tags = {}
+    try:
+        if tiff[:2] == b'II':
+            endian = '<'
+        elif tiff[:2] == b'MM':
+            endian = '>'
+        else:
+            return tags
+        ifd0 = struct.unpack_from(endian + 'I', tiff, 4)[0]
+        exif_ifd = None
+        for tag, ftype, value in _iter_ifd(tiff, ifd0, endian):
+            if tag in IFD0_TAGS:
+                tags[IFD0_TAGS[tag]] = _printable(tag, ftype, value)
+            elif tag == EXIF_IFD_POINTER:
+                exif_ifd = struct.unpack_from(endian + 'I', value)[0] if len(value) >= 4 else None
+        if exif_ifd:
+            for tag, ftype, value in _iter_ifd(tiff, exif_ifd, endian):
+                if tag in EXIF_IFD_TAGS:
+                    tags[EXIF_IFD_TAGS[tag]] = _printable(tag, ftype, value)
+    except (struct.error, ValueError, IndexError):
+        pass
+    return tags
+
+
+def _iter_ifd(tiff, offset, endian):
+    """(tag, type, raw value bytes) for every entry of the IFD at offset"""
+    count = struct.unpack_from(endian + 'H', tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + 12 * i
+        tag, ftype, n = struct.unpack_from(endian + 'HHI', tiff, entry)
+        size = TIFF_TYPE_SIZES.get(ftype, 1) * n
+        if size <= 4:
+            start = entry + 8
+        else:
+            start = struct.unpack_from(endian + 'I', tiff, entry + 8)[0]
+        yield tag, ftype, bytes(tiff[start:start + size])
+
+
+def _printable(tag, ftype, value):
+    if tag == 0x9286:
+        # Character-code prefix dropped, non-printing bytes screened out
+        return bytes(c for c in value[8:] if c >= 32).decode('latin-1').strip()
+    if ftype == 2:
+        value = value.split(b'\x00', 1)[0]
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return str(value)
+    return _latin1(value)
+
+
+def _is_c2pa_jumbf(segment):
+    segment = bytes(segment)
+    return b'jumb' in segment or b'c2pa' in segment
+
+
+def _inflate(data):
+    decompressor = zlib.decompressobj()
+    return decompressor.decompress(data, MAX_TEXT_CHUNK)
+
+
+def _latin1(data):
+    return bytes(data).decode('latin-1')
@@ -0,0 +1,129 @@
+import bisect
+import json
+import os
+import re
+import threading
+
+DEFAULT_SIGNATURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signatures.json')
+SIGNATURES_PATH = os.environ.get('METADATA_SIGNATURES', DEFAULT_SIGNATURES_PATH)
+
+_SEPARATOR = '\x00'
+
+
+class SignatureMatcher:
+    """
+    Generator signatures compiled into a single regex.
+
+    The signature table maps a detection method (the metadata source the text came
+    from, e.g. "C2PA", "EXIF", "PNG Metadata") to an ordered list of signatures:
+
+        {"EXIF": [{"all": ["dall-e"], "source": "DALL-E"}, ...], ...}
+
+    A signature matches a text segment when every term in "all" occurs in it
+    (case-insensitive). All distinct terms of all methods are folded into one
+    trie-shaped regex that is run once over the concatenated text, so the cost per
+    scan grows with the amount of metadata, not with the number of signatures.
+    """
+
+    def __init__(self, table):
+        self.methods = {}
+        terms = set()
+        for method, signatures in table.items():
+            entries = []
+            for signature in signatures:
+                required = tuple(t.lower() for t in signature['all'])
+                entries.append((required, signature['source']))
+                terms.update(required)
+            self.methods[method] = entries
+
+        self.terms = sorted(terms)
+        # Terms that are a prefix of a longer term: the regex reports the longest term at a
+        # position, so the shorter ones starting at the same position are added back from here
+        self._prefixes = {
+            term: [other for other in self.terms if other != term and term.startswith(other)]
+            for term in self.terms
+        }
+        # Zero-width lookahead so every position is tried and overlapping terms are all found
+        self._regex = re.compile(f"(?=({_trie_pattern(self.terms)}))") if self.terms else None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def match(self, scopes):
+        """
+        Find the first signature present in the metadata.
+
+        Args:
+            scopes (list): [(method, [text, ...]), ...] in priority order. Within a method,
+                segments are tried in order and, for the first segment with any match,
+                the earliest signature in the table wins.
+
+        Returns:
+            dict with "source" and "method", or None
+        """
+        segments = []
+        for method, texts in scopes:
+            if method in self.methods:
+                segments.extend((method, str(text).lower()) for text in texts)
+        if not segments or self._regex is None:
+            return None
+
+        starts = []
+        offset = 0
+        for _, text in segments:
+            starts.append(offset)
+            offset += len(text) + len(_SEPARATOR)
+        haystack = _SEPARATOR.join(text for _, text in segments)
+
+        found = [set() for _ in segments]
+        for m in self._regex.finditer(haystack):
+            term = m.group(1)
+            terms = found[bisect.bisect_right(starts, m.start()) - 1]
+            terms.add(term)
+            terms.update(self._prefixes[term])
+
+        for (method, _), terms in zip(segments, found):
+            if not terms:
+                continue
+            for required, source in self.methods[method]:
+                if all(t in terms for t in required):
+                    return {"source": source, "method": method}
+        return None
+
+
+def _trie_pattern(terms):
+    """Regex alternation shaped like a trie, so shared prefixes are only compared once"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node):
+        end = '' in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if end:
+            return f"(?:{body})?"
+        return body
+
+    return emit(trie)
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """Matcher for SIGNATURES_PATH (METADATA_SIGNATURES env var), compiled on first use"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = SignatureMatcher.from_file(SIGNATURES_PATH)
+    return _matcher
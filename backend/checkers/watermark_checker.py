@@ -1,13 +1,79 @@
 import os
+import threading
 try:
     from imwatermark import WatermarkDecoder
 except ImportError:
     WatermarkDecoder = None
 
-def check_watermarks(filepath):
+from checkers.metadata_scanner import scan_metadata
+
+# Set WATERMARK_PREFILTER=0 to run the DWT decode on every image
+WATERMARK_PREFILTER = os.environ.get('WATERMARK_PREFILTER', '1').lower() not in ('0', 'false', 'no', 'off')
+
+# Stable Diffusion pipelines write PNG (sometimes re-saved as WebP/JPEG) at sizes that
+# are multiples of 8 (the VAE downsampling factor), between 256 and 2048 pixels a side
+GENERATOR_FORMATS = ('png', 'webp', 'jpeg')
+GENERATOR_SIZE_MULTIPLE = 8
+GENERATOR_MIN_SIDE = 256
+GENERATOR_MAX_SIDE = 2048
+
+_decoder = None
+_stats = {"checked": 0, "decoded": 0, "skipped": 0, "skip_reasons": {}}
+_lock = threading.Lock()
+
+
+def get_decoder():
+    """WatermarkDecoder for the SD 'bytes' payload, built once and reused"""
+    global _decoder
+    if _decoder is None:
+        _decoder = WatermarkDecoder('bytes', 136)
+    return _decoder
+
+
+def prefilter_reason(meta):
+    """
+    Cheap test on container metadata deciding whether the DWT decode is worth running.
+
+    Args:
+        meta (ImageMetadata): Result of scan_metadata
+
+    Returns:
+        None if the image could carry a generator watermark, otherwise why it cannot
+    """
+    if meta.format not in GENERATOR_FORMATS:
+        return "format"
+    if meta.has_camera_exif:
+        return "camera_exif"
+
+    if meta.width is None or meta.height is None:
+        return None  # Size unknown from the header: let the decoder decide
+    for side in (meta.width, meta.height):
+        if side % GENERATOR_SIZE_MULTIPLE or not GENERATOR_MIN_SIDE <= side <= GENERATOR_MAX_SIDE:
+            return "dimensions"
+    return None
+
+
+def watermark_stats():
+    """How many images were checked, decoded, and skipped by the pre-filter (by reason)"""
+    with _lock:
+        return {**_stats, "skip_reasons": dict(_stats["skip_reasons"]), "prefilter": WATERMARK_PREFILTER}
+
+
+def _count(key, reason=None):
+    with _lock:
+        _stats[key] += 1
+        if reason:
+            _stats["skip_reasons"][reason] = _stats["skip_reasons"].get(reason, 0) + 1
+
+
+def check_watermarks(filepath, context=None):
     """
     Checks for invisible watermarks (specifically Stable Diffusion's 'sd_private').
     Returns a dictionary with detection status.
+
+    If a ScanContext is given, its metadata scan and already-decoded BGR pixels are used.
+    Images that could not come from a generator (camera EXIF, unusual sizes) are skipped
+    before the DWT decode; see watermark_stats().
     """
     result = {
         "detected": False,
@@ -19,43 +85,52 @@ def check_watermarks(filepath):
         return result
 
     try:
-        # Standard Stable Diffusion watermark is 48 bits, detecting 'bytes'
-        decoder = WatermarkDecoder('bytes', 32) # Standard length for some, but SD often uses 48 bits?
-        # Actually, the 'invisible-watermark' library default for SD
-        # typically uses method='dwtDct' combined with a specific decoder.
-        
+        _count("checked")
+        if WATERMARK_PREFILTER:
+            if context is not None:
+                meta = context.metadata
+            else:
+                with open(filepath, 'rb') as f:
+                    meta = scan_metadata(f.read())
+            reason = prefilter_reason(meta)
+            if reason:
+                _count("skipped", reason)
+                return result
+
         # Let's try the standard approach for Stable Diffusion detection
         # The library usually has a specific 'bytes' decoder for it.
-        
         bgr_image = None
-        import cv2
-        bgr_image = cv2.imread(filepath)
+        if context is not None:
+            bgr_image = context.bgr
+        else:
+            import cv2
+            bgr_image = cv2.imread(filepath)
         if bgr_image is None:
             return result
-            
-        decoder = WatermarkDecoder('bytes', 136) # Try generic length or specific
-        watermark = decoder.decode(bgr_image, 'dwtDct')
-        
+
+        _count("decoded")
+        watermark = get_decoder().decode(bgr_image, 'dwtDct')
+
         # Stable Diffusion's watermark often decodes to explicit bytes.
-        # However, a more robust way often used is checking for the specific signature 
+        # However, a more robust way often used is checking for the specific signature
         # that the library 'invisible-watermark' looks for.
-        
+
         # Simplifying: If we decode *something* valid/structured, it might be watermarked.
         # But for 'sd_private', we verify specifically.
-        
+
         # Note: A simpler check using the library's built-in script logic:
         # It usually converts "Stability AI" string to bits?
-        
+
         # If we successfully decode the known string "Stability" or derivatives.
         decoded_text = watermark.decode('utf-8', errors='ignore')
-        
+
         if "Stability" in decoded_text or "sd_private" in decoded_text :
             result["detected"] = True
             result["method"] = "Invisible Watermark"
             result["source"] = "Stable Diffusion"
-        
+
     except Exception as e:
         # print(f"Watermark Check Error: {e}")
         pass
-        
+
     return result
@@ -33,6 +33,19 @@ def init_db():
         except sqlite3.Error as e:
             print(f"Error initializing database: {e}")
         
+        # Persistent backing store for the scan result cache (see result_cache.py)
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS result_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    result_json TEXT NOT NULL,
+                    last_used DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error initializing result cache table: {e}")
+
         # Migration: Add image_path if not exists
         try:
             conn.execute('ALTER TABLE history ADD COLUMN image_path TEXT')
@@ -88,6 +101,33 @@ def clear_history():
             conn.close()
     return False
 
+def get_scan_path(scan_id):
+    """image_path of a history row (None if the row does not exist)"""
+    conn = get_db_connection()
+    if conn:
+        try:
+            row = conn.execute('SELECT image_path FROM history WHERE id = ?', (scan_id,)).fetchone()
+            return row['image_path'] if row else None
+        except sqlite3.Error as e:
+            print(f"Error reading scan: {e}")
+            return None
+        finally:
+            conn.close()
+    return None
+
+def count_scans_with_path(image_path):
+    """Number of history rows pointing at a file (cached video results share one web copy)"""
+    conn = get_db_connection()
+    if conn:
+        try:
+            return conn.execute('SELECT COUNT(*) FROM history WHERE image_path = ?', (image_path,)).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error counting scans: {e}")
+            return None
+        finally:
+            conn.close()
+    return None
+
 def delete_scan(scan_id):
     conn = get_db_connection()
     if conn:
@@ -102,5 +142,46 @@ def delete_scan(scan_id):
             conn.close()
     return False
 
+def get_cached_result(cache_key):
+    conn = get_db_connection()
+    if conn:
+        try:
+            row = conn.execute('SELECT result_json FROM result_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE result_cache SET last_used = CURRENT_TIMESTAMP WHERE cache_key = ?', (cache_key,))
+            conn.commit()
+            return row['result_json']
+        except sqlite3.Error as e:
+            print(f"Error reading result cache: {e}")
+            return None
+        finally:
+            conn.close()
+    return None
+
+def save_cached_result(cache_key, result_json, max_entries=None):
+    conn = get_db_connection()
+    if conn:
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO result_cache (cache_key, result_json, last_used)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''', (cache_key, result_json))
+            if max_entries:
+                # Keep the table bounded: drop the least recently used rows
+                conn.execute('''
+                    DELETE FROM result_cache WHERE cache_key NOT IN (
+                        SELECT cache_key FROM result_cache ORDER BY last_used DESC LIMIT ?
+                    )
+                ''', (max_entries,))
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Error saving cached result: {e}")
+            return False
+        finally:
+            conn.close()
+    return False
+
 # Initialize DB on module load
 init_db()
@@ -0,0 +1,153 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """
+    State of one background scan.
+
+    Workers append progress events with publish(); readers follow them with
+    wait_for_events(), which blocks until something new arrives or the job ends.
+    Only the latest progress event is kept (plus every status event), so a job's
+    memory does not grow with the number of frames; a slow reader skips straight
+    to the newest progress.
+    """
+
+    def __init__(self, job_id, filename):
+        self.id = job_id
+        self.filename = filename
+        self.status = 'queued'  # queued -> running -> done | error | cancelled
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._events = []  # (sequence number, event)
+        self._next_seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'error', 'cancelled')
+
+    def publish(self, event):
+        with self._cond:
+            self._append(event)
+            self._cond.notify_all()
+
+    def _append(self, event):
+        # Caller holds _cond. A newer progress event replaces the previous one.
+        if event.get('event') == 'progress' and self._events and self._events[-1][1].get('event') == 'progress':
+            self._events.pop()
+        self._events.append((self._next_seq, event))
+        self._next_seq += 1
+
+    def set_status(self, status, result=None, error=None):
+        with self._cond:
+            self.status = status
+            if result is not None:
+                self.result = result
+            if error is not None:
+                self.error = error
+            if self.is_finished:
+                self.finished = time.time()
+            self._append(self._status_event())
+            self._cond.notify_all()
+
+    def wait_for_events(self, cursor, timeout=15):
+        """
+        Return (events not seen yet, next cursor, finished flag); waits up to `timeout`
+        seconds for news. Start with cursor 0 and pass back the returned cursor.
+        """
+        with self._cond:
+            if self._next_seq <= cursor and not self.is_finished:
+                self._cond.wait(timeout)
+            events = [event for seq, event in self._events if seq >= cursor]
+            return events, self._next_seq, self.is_finished
+
+    def snapshot(self):
+        with self._cond:
+            progress = next((e for _, e in reversed(self._events) if e.get('event') == 'progress'), None)
+            return {
+                'job_id': self.id,
+                'filename': self.filename,
+                'status': self.status,
+                'progress': progress,
+                'result': self.result,
+                'error': self.error
+            }
+
+    def _status_event(self):
+        event = {'event': 'status', 'status': self.status}
+        if self.status == 'done':
+            event['result'] = self.result
+        if self.error:
+            event['error'] = self.error
+        return event
+
+
+class JobManager:
+    """Runs scan jobs on a worker pool and keeps finished jobs around for `ttl` seconds"""
+
+    def __init__(self, max_workers=2, ttl=3600):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename, work, discard=None):
+        """
+        Queue `work(job)` on the pool and return the Job immediately.
+        `work` returns the result dict; a dict with an "error" key marks the job as failed.
+        `discard(job)` is called instead of `work` when the job is cancelled before it
+        starts, to release what `work` would have cleaned up (e.g. the uploaded file).
+        """
+        self._prune()
+        job = Job(uuid.uuid4().hex, filename)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, work, discard)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        if job.status == 'queued':
+            job.set_status('cancelled')
+        return job
+
+    def _run(self, job, work, discard=None):
+        if job.cancel_event.is_set():
+            if discard is not None:
+                try:
+                    discard(job)
+                except Exception as e:
+                    print(f"⚠️  Cleanup of cancelled job {job.id} failed: {e}")
+            return
+        job.set_status('running')
+        try:
+            result = work(job)
+            if job.cancel_event.is_set():
+                job.set_status('cancelled')
+            elif result is None or 'error' in result:
+                job.set_status('error', error=(result or {}).get('error', 'Unknown error'))
+            else:
+                job.set_status('done', result=result)
+        except Exception as e:
+            job.set_status('error', error=str(e))
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and now - job.finished > self.ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
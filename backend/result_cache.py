@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import database
+
+
+def hash_file(filepath, chunk_size=1024 * 1024):
+    """SHA-256 of a file's bytes, read in chunks"""
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def checkpoint_fingerprint(checkpoint_path):
+    """Fingerprint of the loaded weights, so cached results are invalidated when the checkpoint changes"""
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return "no-checkpoint"
+    return hash_file(checkpoint_path)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of scan results.
+
+    Keys combine the SHA-256 of the uploaded bytes, the checkpoint fingerprint
+    and the request parameters that influence the result. Entries live in an
+    in-memory LRU and are written through to the SQLite database so hits
+    survive a restart.
+    """
+
+    def __init__(self, capacity=256, persist=True, persist_capacity=5000):
+        self.capacity = capacity
+        self.persist = persist
+        self.persist_capacity = persist_capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(file_hash, model_fingerprint, **params):
+        parts = [file_hash, model_fingerprint] + [f"{k}={params[k]}" for k in sorted(params)]
+        return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return a fresh copy of the cached result, or None"""
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+
+        if payload is None and self.persist:
+            payload = database.get_cached_result(key)
+            if payload is not None:
+                self._remember(key, payload)
+
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(payload)
+
+    def put(self, key, result):
+        payload = json.dumps(result)
+        self._remember(key, payload)
+        if self.persist:
+            database.save_cached_result(key, payload, max_entries=self.persist_capacity)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
@@ -0,0 +1,67 @@
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+from checkers.metadata_scanner import scan_metadata
+
+
+class ScanContext:
+    """
+    Everything one /api/predict request needs to know about the uploaded image.
+
+    The bytes are read once and pixels are decoded once (lazily, on first use); the
+    model preprocessor, the metadata checker, the watermark checker and the result
+    cache all work from these shared buffers instead of reopening the file.
+    """
+
+    def __init__(self, data, filename="", path=None):
+        self.data = data
+        self.filename = filename
+        self.path = path
+        self._bgr = None
+        self._decoded = False
+        self._decode_lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read(), os.path.basename(path), path)
+
+    def stream(self):
+        """Fresh file-like object over the bytes (for parsers that want a file)"""
+        return io.BytesIO(self.data)
+
+    @cached_property
+    def sha256(self):
+        return hashlib.sha256(self.data).hexdigest()
+
+    @cached_property
+    def mime_type(self):
+        return mimetypes.guess_type(self.filename)[0] or 'application/octet-stream'
+
+    @cached_property
+    def metadata(self):
+        """Container-level metadata (EXIF, text chunks, C2PA presence, size), parsed without decoding pixels"""
+        return scan_metadata(self.data)
+
+    @property
+    def bgr(self):
+        """Decoded pixels in OpenCV's BGR layout, or None if the bytes are not a readable image"""
+        # The model and the watermark check may ask from different threads; decode only once
+        with self._decode_lock:
+            if not self._decoded:
+                self._bgr = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                self._decoded = True
+            return self._bgr
+
+    @cached_property
+    def rgb(self):
+        if self.bgr is None:
+            return None
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
@@ -86,6 +86,7 @@ async function analyzeImage(imageUrl) {
         // Create FormData
         const formData = new FormData();
         formData.append('file', blob, 'image.png');
+        formData.append('heatmap', 'fast'); // Forward-only patch map, no Grad-CAM backward pass
 
         // Send to API
         console.log('Sending to API:', API_URL);
@@ -180,6 +180,7 @@ async function analyzeImage() {
     try {
         const formData = new FormData();
         formData.append('file', selectedFile); // Changed from 'image' to 'file' to match Flask
+        formData.append('heatmap', 'fast'); // Forward-only patch map, no Grad-CAM backward pass
 
         const response = await fetch(API_URL, {
             method: 'POST',
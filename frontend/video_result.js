@@ -36,6 +36,45 @@ document.addEventListener('DOMContentLoaded', () => {
 // VIDEO PLAYER INITIALIZATION
 // ==========================================
 
+function waitForVideo(src) {
+    const videoWrapper = document.querySelector('.video-wrapper');
+    const notice = document.createElement('div');
+    notice.style.cssText = `
+        position: absolute;
+        top: 50%;
+        left: 50%;
+        transform: translate(-50%, -50%);
+        text-align: center;
+        color: rgba(255, 255, 255, 0.6);
+        z-index: 5;
+    `;
+    notice.innerHTML = `
+        <i class="fas fa-spinner fa-spin" style="font-size: 3rem; margin-bottom: 1rem; display: block; color: rgba(227, 245, 20, 0.5);"></i>
+        <p style="font-size: 1.1rem;">Preparing video for playback...</p>
+    `;
+    if (videoWrapper) videoWrapper.appendChild(notice);
+
+    const filename = src.split('/').pop();
+    const poll = async () => {
+        try {
+            const response = await fetch(`/api/video_status/${encodeURIComponent(filename)}`);
+            const status = await response.json();
+            if (status.pending) {
+                setTimeout(poll, 1000);
+                return;
+            }
+        } catch (error) {
+            console.warn('Video status check failed, retrying:', error);
+            setTimeout(poll, 2000);
+            return;
+        }
+        // Ready, or the copy failed (the player's error handler reports it)
+        notice.remove();
+        videoPlayer.src = src;
+    };
+    poll();
+}
+
 function initializeVideoPlayer() {
     // Set video source if available
     // Try multiple sources in order of priority
@@ -45,7 +84,12 @@ function initializeVideoPlayer() {
         if (!src.startsWith('http') && !src.startsWith('/')) {
             src = '/' + src;
         }
-        videoPlayer.src = src;
+        if (currentResult.video_ready === false) {
+            // The web-playback copy is still being written in the background
+            waitForVideo(src);
+        } else {
+            videoPlayer.src = src;
+        }
     } else if (currentResult && currentResult.image_path) {
         // Fallback or Image Path logic
         let src = currentResult.image_path;
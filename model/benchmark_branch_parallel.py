@@ -0,0 +1,85 @@
+"""
+Compare sequential and concurrent branch execution of DeepfakeDetector on CPU.
+
+For every intra-op thread budget (default 8 and 32, i.e. an 8-core and a 32-core host),
+times batch-1 (and optionally larger) forward passes with the branches run one after
+another and with DeepfakeDetector.set_parallel_branches, and checks that both modes
+give the same logits. Weights are random (latency does not depend on them).
+
+Thread budgets above os.cpu_count() are skipped: run the script on each host size.
+No measurements have been recorded yet, so PARALLEL_BRANCHES stays off by default;
+turn it on for a host type once this script shows a batch-1 gain there.
+
+Usage: python benchmark_branch_parallel.py [--threads 8,32] [--batch-sizes 1,4] [--iters 30]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import torch
+
+# Setup paths
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from src.config import Config
+from src.models import DeepfakeDetector, split_threads
+
+
+def time_forward(model, batch, iters, warmup):
+    latencies = []
+    with torch.inference_mode():
+        for i in range(warmup + iters):
+            start = time.perf_counter()
+            logits = model(batch)
+            elapsed = time.perf_counter() - start
+            if i >= warmup:
+                latencies.append(elapsed * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(0.9 * (len(latencies) - 1))], logits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs. concurrent branch execution latency")
+    parser.add_argument("--threads", type=str, default="8,32", help="Comma-separated intra-op thread budgets")
+    parser.add_argument("--batch-sizes", type=str, default="1,4")
+    parser.add_argument("--iters", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f"🖥️  {cores} logical cores, torch {torch.__version__}, parallel backend: {torch.__config__.parallel_info().splitlines()[0]}")
+
+    model = DeepfakeDetector(pretrained=False).eval()
+    print(f"Branches: {', '.join(model.branch_names)}")
+
+    print(f"\n{'Threads':>7} | {'Batch':>5} | {'Mode':<10} | {'p50 (ms)':>9} | {'p90 (ms)':>9} | {'Speedup':>7} | Split")
+    print("-" * 85)
+    for threads in [int(t) for t in args.threads.split(',')]:
+        if threads > cores:
+            print(f"{threads:>7} | skipped: host has {cores} cores")
+            continue
+        torch.set_num_threads(threads)
+        split = split_threads(model.branch_names, threads)
+        split_text = " ".join(f"{name}={n}" for name, n in split.items())
+
+        for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+            batch = torch.randn(batch_size, 3, Config.IMAGE_SIZE, Config.IMAGE_SIZE)
+
+            model.set_parallel_branches(False)
+            seq_p50, seq_p90, seq_logits = time_forward(model, batch, args.iters, args.warmup)
+            model.set_parallel_branches(True, threads=threads)
+            par_p50, par_p90, par_logits = time_forward(model, batch, args.iters, args.warmup)
+
+            diff = (seq_logits - par_logits).abs().max().item()
+            print(f"{threads:>7} | {batch_size:>5} | {'sequential':<10} | {seq_p50:>9.1f} | {seq_p90:>9.1f} | {'':>7} |")
+            print(f"{threads:>7} | {batch_size:>5} | {'parallel':<10} | {par_p50:>9.1f} | {par_p90:>9.1f} | "
+                  f"{seq_p50 / par_p50:>6.2f}x | {split_text} (max |Δlogit| {diff:.1e})")
+
+    model.set_parallel_branches(False)
+
+
+if __name__ == "__main__":
+    main()
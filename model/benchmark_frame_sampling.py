@@ -0,0 +1,100 @@
+"""
+Benchmark frame sampling strategies used by video_inference.process_video,
+including the ffmpeg rawvideo source (downscaled to 640 px wide, when ffmpeg is installed).
+
+Writes synthetic videos (moving gradient + noise, so the codec has real work to do)
+and times how long each strategy takes to deliver the sampled frames. No model needed.
+
+Usage: python benchmark_frame_sampling.py [--seconds 20] [--fps 30] [--sample-rates 1,5,20]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Setup paths
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from src.video_inference import iter_sampled_frames
+from src.ffmpeg_frames import iter_ffmpeg_frames
+
+STRATEGIES = ["read", "grab", "seek", "ffmpeg"]
+RESOLUTIONS = {"360p": (640, 360), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def make_synthetic_video(path, width, height, fps, seconds):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError("cv2.VideoWriter could not open an mp4v writer")
+
+    rng = np.random.default_rng(0)
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    for i in range(int(fps * seconds)):
+        shift = (i * 7) % width
+        row = np.roll(xs, shift).astype(np.uint8)
+        frame = np.repeat(np.repeat(row[None, :, None], height, axis=0), 3, axis=2)
+        noise = rng.integers(0, 32, size=(height, width, 3), dtype=np.uint8)
+        frame = cv2.add(frame, noise)
+        cv2.putText(frame, str(i), (20, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+
+
+def time_strategy(path, strategy, frames_per_second):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(int(fps / frames_per_second), 1)
+
+    start = time.perf_counter()
+    if strategy == "ffmpeg":
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frames = iter_ffmpeg_frames(path, step, width, height)
+    else:
+        frames = iter_sampled_frames(cap, step, strategy=strategy, total_frames=total_frames)
+    indices = [index for index, _ in frames]
+    elapsed = time.perf_counter() - start
+    cap.release()
+    return elapsed, indices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cap.read / cap.grab / seek frame sampling")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--sample-rates", type=str, default="1,5,20", help="Comma-separated frames_per_second values")
+    parser.add_argument("--resolutions", type=str, default="360p,1080p", help=f"Any of {','.join(RESOLUTIONS)}")
+    args = parser.parse_args()
+
+    sample_rates = [int(r) for r in args.sample_rates.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'Video':<8} | {'Sample/s':>8} | {'Strategy':<8} | {'Frames':>6} | {'Time (s)':>8} | {'Speedup':>7} | Indices")
+        print("-" * 75)
+        for name in args.resolutions.split(','):
+            width, height = RESOLUTIONS[name]
+            path = os.path.join(tmp, f"synthetic_{name}.mp4")
+            make_synthetic_video(path, width, height, args.fps, args.seconds)
+
+            for rate in sample_rates:
+                baseline_time, baseline_indices = None, None
+                for strategy in STRATEGIES:
+                    if strategy == "ffmpeg" and shutil.which("ffmpeg") is None:
+                        continue
+                    elapsed, indices = time_strategy(path, strategy, rate)
+                    if strategy == "read":
+                        baseline_time, baseline_indices = elapsed, indices
+                    speedup = baseline_time / elapsed if elapsed > 0 else float('inf')
+                    match = "same" if indices == baseline_indices else "DIFFERENT"
+                    print(f"{name:<8} | {rate:>8} | {strategy:<8} | {len(indices):>6} | {elapsed:>8.3f} | {speedup:>6.2f}x | {match}")
+            print("-" * 75)
+
+
+if __name__ == "__main__":
+    main()
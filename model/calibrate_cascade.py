@@ -0,0 +1,241 @@
+"""
+Train the cascade's auxiliary head and pick its uncertain band (see src/cascade.py).
+
+Every image is run once through the light branches (frequency + patch) and once through
+the full model. The CascadeHead is fitted on one half of the images. The other half is
+split again: on the selection quarter every (low, high) band is scored, and the band
+that answers the most images early while losing at most --max-accuracy-loss accuracy
+against the full model is saved. Its accuracy loss and early-exit rate are then
+measured on the verification quarter, which took no part in the choice, so the reported
+loss is not biased by the band search.
+
+Usage: python calibrate_cascade.py --data /path/to/Test [--checkpoint results/checkpoints/algro_markv2.safetensors]
+                                   [--max-accuracy-loss 0.005] [--output results/checkpoints/cascade_head.pth]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+
+# Setup paths
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from src.cascade import CascadeHead, LIGHT_BRANCHES, light_features, save_cascade
+from src.dataset import DeepfakeDataset
+from src.tools import load_detector
+
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+
+def collect(model, loader, device):
+    """
+    Light features, full-model probabilities and labels for every image, plus the
+    average per-image time of the light pass and of the heavy remainder.
+    """
+    light_all, full_all, labels_all = [], [], []
+    light_time = heavy_time = 0.0
+    count = 0
+
+    with torch.inference_mode():
+        for images, labels in loader:
+            images = images.to(device)
+
+            synchronize(device)
+            start = time.perf_counter()
+            feats, light, _ = light_features(model, images)
+            synchronize(device)
+            mid = time.perf_counter()
+            heavy, _ = model.branch_features(images, skip=LIGHT_BRANCHES)
+            heavy.update(feats)
+            logits = model.classifier(model.fuse(heavy))
+            synchronize(device)
+            end = time.perf_counter()
+
+            light_time += mid - start
+            heavy_time += end - mid
+            count += images.shape[0]
+
+            light_all.append(light.float().cpu())
+            full_all.append(torch.sigmoid(logits).view(-1).float().cpu())
+            labels_all.append(labels.float())
+            print(f"   {count}/{len(loader.dataset)} images", end="\r")
+
+    print()
+    return (torch.cat(light_all), torch.cat(full_all).numpy(), torch.cat(labels_all).numpy(),
+            light_time / count, heavy_time / count)
+
+
+def fit_head(features, labels, epochs, device):
+    """Full-batch Adam on the light features, with the class balance of the fit split"""
+    head = CascadeHead(features.shape[1]).to(device)
+    x = features.to(device)
+    y = torch.as_tensor(labels, dtype=torch.float32, device=device).view(-1, 1)
+    positives = float(y.sum())
+    pos_weight = torch.tensor([(len(y) - positives) / max(positives, 1.0)], device=device)
+    criterion = nn.BCEWithLogitsLoss(pos_weight=pos_weight)
+    optimizer = torch.optim.Adam(head.parameters(), lr=1e-3, weight_decay=1e-4)
+
+    head.train()
+    for epoch in range(epochs):
+        optimizer.zero_grad()
+        loss = criterion(head(x), y)
+        loss.backward()
+        optimizer.step()
+        if (epoch + 1) % max(epochs // 5, 1) == 0:
+            print(f"   epoch {epoch + 1}/{epochs}  loss {loss.item():.4f}")
+    return head.eval()
+
+
+def choose_band(early, full, labels, max_loss, grid=200):
+    """
+    Widest early-exit region whose accuracy stays within max_loss of the full model.
+
+    Images with early < low are answered REAL, early > high FAKE, the rest by the full
+    model. Candidate thresholds are quantiles of the early probabilities on either
+    side of 0.5; (0, 1) escalates everything and is always feasible.
+
+    Returns:
+        dict: low, high, early-exit fraction, full and cascade accuracy
+    """
+    truth = labels > 0.5
+    is_real, is_fake = (~truth).astype(np.float64), truth.astype(np.float64)
+    full_correct = ((full > 0.5) == truth).astype(np.float64)
+    base_acc = full_correct.mean()
+
+    quantiles = np.quantile(early, np.linspace(0, 1, grid + 1))
+    lows = np.unique(np.concatenate([[0.0, 0.5], quantiles[quantiles < 0.5]]))
+    highs = np.unique(np.concatenate([[0.5, 1.0], quantiles[quantiles > 0.5]]))
+
+    below = early[None, :] < lows[:, None]   # (L, N) answered REAL early
+    above = early[None, :] > highs[:, None]  # (H, N) answered FAKE early
+    # Accuracy change from answering early instead of asking the full model
+    gain_low = (below * (is_real - full_correct)).sum(axis=1)
+    gain_high = (above * (is_fake - full_correct)).sum(axis=1)
+
+    n = len(early)
+    accuracy = base_acc + (gain_low[:, None] + gain_high[None, :]) / n
+    early_frac = (below.sum(axis=1)[:, None] + above.sum(axis=1)[None, :]) / n
+    feasible = base_acc - accuracy <= max_loss + 1e-12
+
+    # Most early exits first, then best accuracy
+    score = np.where(feasible, early_frac + 1e-6 * accuracy, -np.inf)
+    i, j = np.unravel_index(np.argmax(score), score.shape)
+    return {
+        "low": float(lows[i]),
+        "high": float(highs[j]),
+        "early_exit_rate": float(early_frac[i, j]),
+        "full_accuracy": float(base_acc),
+        "cascade_accuracy": float(accuracy[i, j]),
+    }
+
+
+def evaluate_band(early, full, labels, low, high):
+    """Full and cascade accuracy and early-exit fraction of a fixed band"""
+    truth = labels > 0.5
+    cascade = np.where(early < low, False, np.where(early > high, True, full > 0.5))
+    return {
+        "early_exit_rate": float(((early < low) | (early > high)).mean()),
+        "full_accuracy": float(((full > 0.5) == truth).mean()),
+        "cascade_accuracy": float((cascade == truth).mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the cascade head and calibrate its uncertain band")
+    parser.add_argument("--data", type=str, required=True, help="Labelled image directory (real/fake in the path)")
+    parser.add_argument("--checkpoint", type=str, default=os.path.join(CURRENT_DIR, "results", "checkpoints", "algro_markv2.safetensors"))
+    parser.add_argument("--output", type=str, default=os.path.join(CURRENT_DIR, "results", "checkpoints", "cascade_head.pth"))
+    parser.add_argument("--max-accuracy-loss", type=float, default=0.005, help="Allowed accuracy drop vs. the full model")
+    parser.add_argument("--max-samples", type=int, default=4000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"🚀 Using device: {device}")
+
+    paths, labels = DeepfakeDataset.scan_directory(args.data)
+    if not paths:
+        print(f"❌ No labelled images found in {args.data}")
+        sys.exit(1)
+    pairs = list(zip(paths, labels))
+    random.Random(args.seed).shuffle(pairs)
+    pairs = pairs[:args.max_samples]
+    print(f"✅ Using {len(pairs)} images")
+
+    print(f"\n🔹 Loading Model: {args.checkpoint}")
+    model = load_detector(args.checkpoint, device)
+    print(f"Branches: {', '.join(model.branch_names)}")
+
+    dataset = DeepfakeDataset(file_paths=[p for p, _ in pairs], labels=[l for _, l in pairs], phase='val')
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.workers)
+
+    print("\n🔍 Scoring images (light branches and full model)...")
+    light, full, labels, t_light, t_heavy = collect(model, loader, device)
+
+    # Fit / band selection / verification: half, quarter, quarter
+    split = len(labels) // 2
+    verify = split + (len(labels) - split) // 2
+    print(f"\n🧠 Fitting cascade head on {split} images...")
+    torch.manual_seed(args.seed)
+    head = fit_head(light[:split], labels[:split], args.epochs, device)
+
+    with torch.no_grad():
+        early = torch.sigmoid(head(light[split:].to(device))).view(-1).cpu().numpy()
+    select_early, verify_early = early[:verify - split], early[verify - split:]
+
+    selected = choose_band(select_early, full[split:verify], labels[split:verify], args.max_accuracy_loss)
+    band = evaluate_band(verify_early, full[verify:], labels[verify:], selected["low"], selected["high"])
+    band.update(low=selected["low"], high=selected["high"])
+    accuracy_loss = band["full_accuracy"] - band["cascade_accuracy"]
+    escalation = 1.0 - band["early_exit_rate"]
+    # Per image, the full model costs light + heavy; the cascade costs light + escalation * heavy
+    speedup = (t_light + t_heavy) / (t_light + escalation * t_heavy)
+
+    report = {
+        **band,
+        "escalation_rate": escalation,
+        "accuracy_loss": accuracy_loss,
+        "max_accuracy_loss": args.max_accuracy_loss,
+        "selection": {k: v for k, v in selected.items() if k not in ("low", "high")},
+        "selection_images": verify - split,
+        "verification_images": len(labels) - verify,
+        "light_ms_per_image": t_light * 1000,
+        "heavy_ms_per_image": t_heavy * 1000,
+        "estimated_speedup": speedup,
+        "branches": list(model.branch_names),
+        "checkpoint": os.path.basename(args.checkpoint),
+    }
+
+    print(f"\n📊 Calibration (band chosen on {verify - split} images, verified on {len(labels) - verify} others)")
+    print(f"   Band:               [{band['low']:.4f}, {band['high']:.4f}]")
+    print(f"   Full accuracy:      {band['full_accuracy'] * 100:.2f}%")
+    print(f"   Cascade accuracy:   {band['cascade_accuracy'] * 100:.2f}% "
+          f"(loss {accuracy_loss * 100:.2f} points; {(selected['full_accuracy'] - selected['cascade_accuracy']) * 100:.2f} on the selection set)")
+    print(f"   Escalated:          {escalation * 100:.1f}%")
+    print(f"   Light / heavy pass: {t_light * 1000:.2f} / {t_heavy * 1000:.2f} ms per image")
+    print(f"   Estimated speedup:  {speedup:.2f}x")
+    if accuracy_loss > args.max_accuracy_loss:
+        print(f"⚠️  Verified accuracy loss exceeds --max-accuracy-loss {args.max_accuracy_loss * 100:.2f} points; "
+              "use more images or a smaller loss target before serving this band")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    save_cascade(args.output, head.cpu(), band["low"], band["high"], report)
+    print(f"\n💾 Saved cascade head to {args.output}")
+    print("   Serve it with CASCADE_HEAD=<path> in the backend environment.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Parity check between an exported ONNX model (ONNX Runtime, CPU) and eager PyTorch.
+
+Runs a fixed image set (sorted file list, so every run sees the same images) through
+both, and compares logits, fake probabilities, REAL/FAKE decisions and patch maps. Also
+compares the matrix-product spectrum used in the export with torch.fft (get_fft_feature).
+Exits with status 1 when any tolerance is exceeded or a decision flips, so it can gate a deploy.
+
+Usage: python check_onnx_parity.py --onnx model.onnx --images /path/to/images
+                                   [--checkpoint results/checkpoints/algro_markv2.safetensors] [--atol 1e-3]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import albumentations as A
+import cv2
+import torch
+from albumentations.pytorch import ToTensorV2
+
+# Setup paths
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from src.config import Config
+from src.onnx_export import LogSpectrum
+from src.onnx_runtime import OnnxDetector
+from src.tools import load_detector
+from src.utils import get_fft_feature
+
+EXTS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def load_images(directory, limit):
+    transform = A.Compose([
+        A.Resize(Config.IMAGE_SIZE, Config.IMAGE_SIZE),
+        A.Normalize(mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225)),
+        ToTensorV2(),
+    ])
+    files = sorted(f for f in glob.glob(os.path.join(directory, "**", "*.*"), recursive=True)
+                   if f.lower().endswith(EXTS))
+    names, tensors = [], []
+    for path in files:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        tensors.append(transform(image=image)['image'])
+        names.append(os.path.relpath(path, directory))
+        if len(names) >= limit:
+            break
+    return names, tensors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ONNX Runtime and eager PyTorch outputs")
+    parser.add_argument("--onnx", type=str, required=True)
+    parser.add_argument("--images", type=str, required=True, help="Directory of test images")
+    parser.add_argument("--checkpoint", type=str, default=os.path.join(CURRENT_DIR, "results", "checkpoints", "algro_markv2.safetensors"))
+    parser.add_argument("--max-images", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--atol", type=float, default=1e-3, help="Max allowed |Δlogit|")
+    parser.add_argument("--map-atol", type=float, default=1e-3, help="Max allowed |Δ patch probability|")
+    args = parser.parse_args()
+
+    names, tensors = load_images(args.images, args.max_images)
+    if not tensors:
+        print(f"❌ No images found in {args.images}")
+        sys.exit(1)
+    print(f"✅ {len(tensors)} images")
+
+    model = load_detector(args.checkpoint, parallel_branches=False)
+    start = time.perf_counter()
+    session = OnnxDetector(args.onnx)
+    print(f"🔹 ONNX Runtime session ready in {time.perf_counter() - start:.2f}s (branches: {', '.join(session.branch_names)})")
+    spectrum = LogSpectrum(Config.IMAGE_SIZE, Config.IMAGE_SIZE)
+
+    worst_logit = worst_prob = worst_map = worst_spectrum = 0.0
+    flips = []
+    eager_time = onnx_time = 0.0
+    for i in range(0, len(tensors), args.batch_size):
+        batch = torch.stack(tensors[i:i + args.batch_size])
+        with torch.inference_mode():
+            start = time.perf_counter()
+            eager_logits, eager_patches = model(batch, return_patch_map=True)
+            eager_time += time.perf_counter() - start
+            worst_spectrum = max(worst_spectrum, (spectrum(batch) - get_fft_feature(batch)).abs().max().item())
+
+        start = time.perf_counter()
+        onnx_logits, onnx_patches = session(batch, return_patch_map=True)
+        onnx_time += time.perf_counter() - start
+
+        worst_logit = max(worst_logit, (eager_logits - onnx_logits).abs().max().item())
+        eager_probs, onnx_probs = torch.sigmoid(eager_logits).view(-1), torch.sigmoid(onnx_logits).view(-1)
+        worst_prob = max(worst_prob, (eager_probs - onnx_probs).abs().max().item())
+        if eager_patches is not None and onnx_patches is not None:
+            worst_map = max(worst_map, (torch.sigmoid(eager_patches) - torch.sigmoid(onnx_patches)).abs().max().item())
+        for j, (p, q) in enumerate(zip(eager_probs.tolist(), onnx_probs.tolist())):
+            if (p > 0.5) != (q > 0.5):
+                flips.append((names[i + j], p, q))
+
+    print(f"\n   Max |Δlogit|:          {worst_logit:.2e} (tolerance {args.atol:.0e})")
+    print(f"   Max |Δprob|:           {worst_prob:.2e}")
+    print(f"   Max |Δpatch prob|:     {worst_map:.2e} (tolerance {args.map_atol:.0e})")
+    print(f"   Max |Δspectrum|:       {worst_spectrum:.2e} (export DFT vs torch.fft)")
+    print(f"   Decision flips:        {len(flips)}")
+    for name, p, q in flips:
+        print(f"      {name}: eager {p:.4f} vs onnx {q:.4f}")
+    print(f"   Time per image:        eager {eager_time / len(tensors) * 1000:.1f} ms, "
+          f"onnx {onnx_time / len(tensors) * 1000:.1f} ms")
+
+    if worst_logit > args.atol or worst_map > args.map_atol or flips:
+        print("\n❌ Parity check failed")
+        sys.exit(1)
+    print("\n✅ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Measure how far each reduced-precision inference mode drifts from fp32 on this host.
+
+Scores a validation set (drawn through DeepfakeDataset) in fp32 and in every mode given
+with --precisions (see DeepfakeDetector.set_precision), and records per mode the maximum
+and mean probability deviation from fp32, REAL/FAKE decision flips, accuracy and
+batch-1 latency. The record is tagged with the CPU model, so results from several host
+types can be kept side by side to decide where INFERENCE_PRECISION is turned on.
+
+Usage: python check_precision_drift.py --data /path/to/Val [--precisions bf16,channels_last,bf16+channels_last]
+                                       [--max-samples 1000] [--output results/precision_drift.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+# Setup paths
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from src.dataset import DeepfakeDataset
+from src.models import PRECISIONS
+from src.tools import latency_ms, load_detector
+
+
+def cpu_name():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def score(model, loader):
+    probs = []
+    with torch.inference_mode():
+        for images, _ in loader:
+            probs.append(torch.sigmoid(model(images)).view(-1).float())
+    return torch.cat(probs).numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Probability drift of bf16 / channels_last inference against fp32")
+    parser.add_argument("--data", type=str, required=True, help="Labelled validation directory (real/fake in the path)")
+    parser.add_argument("--checkpoint", type=str, default=os.path.join(CURRENT_DIR, "results", "checkpoints", "algro_markv2.safetensors"))
+    parser.add_argument("--precisions", type=str, default="bf16,channels_last,bf16+channels_last")
+    parser.add_argument("--max-samples", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--latency-iters", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=os.path.join(CURRENT_DIR, "results", "precision_drift.json"),
+                        help="JSON file; records for other hosts already in it are kept")
+    args = parser.parse_args()
+
+    modes = [p for p in args.precisions.split(',') if p != "fp32"]
+    for mode in modes:
+        if mode not in PRECISIONS:
+            print(f"❌ Unknown precision '{mode}', expected one of {', '.join(PRECISIONS)}")
+            sys.exit(1)
+
+    host = cpu_name()
+    print(f"🖥️  {host}, {torch.get_num_threads()} threads, torch {torch.__version__}")
+
+    paths, labels = DeepfakeDataset.scan_directory(args.data)
+    pairs = list(zip(paths, labels))
+    random.Random(args.seed).shuffle(pairs)
+    pairs = pairs[:args.max_samples]
+    if not pairs:
+        print(f"❌ No labelled images found in {args.data}")
+        sys.exit(1)
+    truth = np.array([l for _, l in pairs]) > 0.5
+    dataset = DeepfakeDataset(file_paths=[p for p, _ in pairs], labels=[l for _, l in pairs], phase='val')
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.workers)
+    print(f"✅ {len(pairs)} validation images")
+
+    print(f"\n🔹 Loading Model: {args.checkpoint}")
+    model = load_detector(args.checkpoint)
+
+    results = {}
+    reference = None
+    for mode in ["fp32"] + modes:
+        print(f"\n🔍 Scoring in {mode}...")
+        model.set_precision(mode)
+        probs = score(model, loader)
+        if reference is None:
+            reference = probs
+        diff = np.abs(probs - reference)
+        results[mode] = {
+            "max_abs_prob_delta": float(diff.max()),
+            "mean_abs_prob_delta": float(diff.mean()),
+            "decision_flips": int(((probs > 0.5) != (reference > 0.5)).sum()),
+            "accuracy": float(((probs > 0.5) == truth).mean()),
+            "latency_p50_ms": latency_ms(model, args.latency_iters)[0],
+        }
+    model.set_precision("fp32")
+
+    fp32_latency = results["fp32"]["latency_p50_ms"]
+    print(f"\n{'Mode':<20} | {'Max |Δp|':>9} | {'Mean |Δp|':>9} | {'Flips':>5} | {'Accuracy':>8} | {'p50 (ms)':>9} | {'Speedup':>7}")
+    print("-" * 90)
+    for mode, row in results.items():
+        print(f"{mode:<20} | {row['max_abs_prob_delta']:>9.2e} | {row['mean_abs_prob_delta']:>9.2e} | "
+              f"{row['decision_flips']:>5} | {row['accuracy'] * 100:>7.2f}% | {row['latency_p50_ms']:>9.1f} | "
+              f"{fp32_latency / row['latency_p50_ms']:>6.2f}x")
+
+    records = {}
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            records = json.load(f)
+    records[host] = {
+        "threads": torch.get_num_threads(),
+        "torch": torch.__version__,
+        "checkpoint": os.path.basename(args.checkpoint),
+        "images": len(pairs),
+        "modes": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(records, f, indent=2)
+    print(f"\n💾 Recorded drift for '{host}' in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Export DeepfakeDetector (all enabled branches, the FFT frequency feature and the
+patch-map head) to ONNX for the ONNX Runtime serving path.
+
+Serve the result with ONNX_MODEL=<path> (backend) or --checkpoints <path> (src/inference.py),
+and check it with check_onnx_parity.py before deploying.
+
+Usage: python export_onnx.py [--checkpoint results/checkpoints/algro_markv2.safetensors] [--output model.onnx]
+"""
+import argparse
+import os
+import sys
+
+# Setup paths
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from src.config import Config
+from src.onnx_export import ONNX_OPSET, export_onnx
+from src.tools import load_detector
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export DeepfakeDetector to ONNX")
+    parser.add_argument("--checkpoint", type=str, default=os.path.join(CURRENT_DIR, "results", "checkpoints", "algro_markv2.safetensors"))
+    parser.add_argument("--output", type=str, default=None, help="Default: checkpoint name with .onnx")
+    parser.add_argument("--opset", type=int, default=ONNX_OPSET)
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.checkpoint)[0] + ".onnx"
+
+    print(f"🔹 Loading Model: {args.checkpoint}")
+    model = load_detector(args.checkpoint, parallel_branches=False)
+    print(f"Branches: {', '.join(model.branch_names)}")
+
+    print(f"📦 Exporting to ONNX (opset {args.opset}, {Config.IMAGE_SIZE}px input, dynamic batch)...")
+    outputs = export_onnx(model, output, opset=args.opset)
+
+    print(f"✅ Saved {output} ({os.path.getsize(output) / (1024 * 1024):.1f} MB, outputs: {', '.join(outputs)})")
+    print(f"   Check it with: python check_onnx_parity.py --onnx {output} --checkpoint {args.checkpoint} --images <dir>")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Build an INT8 CPU model from a safetensors checkpoint and compare it with fp32.
+
+- Dynamic quantization: Linear layers of the fusion classifier and the Swin MLP blocks
+- Static post-training quantization: the RGB (EfficientNetV2) features and the frequency
+  and patch conv stacks, calibrated on a subset drawn through DeepfakeDataset
+
+The report (printed and saved next to the model as JSON) gives batch-1 CPU latency,
+weight memory and accuracy of both models on a held-out set disjoint from the
+calibration images. Serve the result with INT8_MODEL=<path> (backend) or
+--checkpoints <path> (src/inference.py).
+
+Usage: python quantize_model.py --data /path/to/Test [--checkpoint results/checkpoints/algro_markv2.safetensors]
+                                [--calib-samples 256] [--eval-samples 1000]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+# Setup paths
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+from src.dataset import DeepfakeDataset
+from src.quantization import INT8_SUFFIX, quantize_detector, save_quantized, select_engine
+from src.tools import latency_ms, load_detector
+
+
+def weights_mb(model):
+    """Size of the serialized weights (packed int8 weights for quantized layers)"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def predict(model, loader):
+    probs, labels = [], []
+    with torch.inference_mode():
+        for images, batch_labels in loader:
+            probs.append(torch.sigmoid(model(images)).view(-1).float())
+            labels.append(batch_labels.float())
+    return torch.cat(probs).numpy(), torch.cat(labels).numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization for CPU inference")
+    parser.add_argument("--data", type=str, required=True, help="Labelled image directory (real/fake in the path)")
+    parser.add_argument("--checkpoint", type=str, default=os.path.join(CURRENT_DIR, "results", "checkpoints", "algro_markv2.safetensors"))
+    parser.add_argument("--output", type=str, default=None, help=f"Default: checkpoint name with {INT8_SUFFIX}")
+    parser.add_argument("--calib-samples", type=int, default=256)
+    parser.add_argument("--eval-samples", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--latency-iters", type=int, default=30)
+    parser.add_argument("--engine", type=str, default=None, help="Quantized backend: x86, fbgemm or qnnpack")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.checkpoint)[0] + INT8_SUFFIX
+    engine = args.engine or select_engine()
+    print(f"🚀 CPU quantization with the '{engine}' engine, {torch.get_num_threads()} threads")
+
+    paths, labels = DeepfakeDataset.scan_directory(args.data)
+    pairs = list(zip(paths, labels))
+    random.Random(args.seed).shuffle(pairs)
+    calib = pairs[:args.calib_samples]
+    held_out = pairs[args.calib_samples:args.calib_samples + args.eval_samples]
+    if not calib or not held_out:
+        print(f"❌ Need at least {args.calib_samples + 1} labelled images in {args.data}, found {len(pairs)}")
+        sys.exit(1)
+    print(f"✅ {len(calib)} calibration images, {len(held_out)} held-out images")
+
+    def loader(subset):
+        dataset = DeepfakeDataset(file_paths=[p for p, _ in subset], labels=[l for _, l in subset], phase='val')
+        return DataLoader(dataset, batch_size=args.batch_size, shuffle=False, num_workers=args.workers)
+
+    print(f"\n🔹 Loading Model: {args.checkpoint}")
+    model = load_detector(args.checkpoint)
+    print(f"Branches: {', '.join(model.branch_names)}")
+
+    print("\n📏 Calibrating and converting...")
+    qmodel = quantize_detector(model, (images for images, _ in loader(calib)), engine=engine)
+
+    print("\n🔍 Evaluating fp32 and INT8 on the held-out set...")
+    eval_loader = loader(held_out)
+    fp32_probs, truth = predict(model, eval_loader)
+    int8_probs, _ = predict(qmodel, eval_loader)
+    fp32_acc = float(((fp32_probs > 0.5) == (truth > 0.5)).mean())
+    int8_acc = float(((int8_probs > 0.5) == (truth > 0.5)).mean())
+    diff = np.abs(fp32_probs - int8_probs)
+
+    print("\n⏱️  Measuring batch-1 latency...")
+    fp32_p50, fp32_p90 = latency_ms(model, args.latency_iters)
+    int8_p50, int8_p90 = latency_ms(qmodel, args.latency_iters)
+    fp32_mb, int8_mb = weights_mb(model), weights_mb(qmodel)
+
+    report = {
+        "engine": engine,
+        "threads": torch.get_num_threads(),
+        "checkpoint": os.path.basename(args.checkpoint),
+        "branches": list(model.branch_names),
+        "calibration_images": len(calib),
+        "held_out_images": len(held_out),
+        "fp32": {"accuracy": fp32_acc, "latency_p50_ms": fp32_p50, "latency_p90_ms": fp32_p90, "weights_mb": fp32_mb},
+        "int8": {"accuracy": int8_acc, "latency_p50_ms": int8_p50, "latency_p90_ms": int8_p90, "weights_mb": int8_mb},
+        "accuracy_delta": int8_acc - fp32_acc,
+        "decision_agreement": float(((fp32_probs > 0.5) == (int8_probs > 0.5)).mean()),
+        "mean_abs_prob_delta": float(diff.mean()),
+        "max_abs_prob_delta": float(diff.max()),
+    }
+
+    print(f"\n{'':<10} | {'Accuracy':>8} | {'p50 (ms)':>9} | {'p90 (ms)':>9} | {'Weights (MB)':>12}")
+    print("-" * 60)
+    for name in ("fp32", "int8"):
+        row = report[name]
+        print(f"{name:<10} | {row['accuracy'] * 100:>7.2f}% | {row['latency_p50_ms']:>9.1f} | "
+              f"{row['latency_p90_ms']:>9.1f} | {row['weights_mb']:>12.1f}")
+    print(f"\n   Accuracy delta:       {report['accuracy_delta'] * 100:+.2f} points")
+    print(f"   Speedup (p50):        {fp32_p50 / int8_p50:.2f}x")
+    print(f"   Weight memory:        {int8_mb / fp32_mb * 100:.0f}% of fp32")
+    print(f"   Decision agreement:   {report['decision_agreement'] * 100:.2f}%")
+    print(f"   Mean / max |Δprob|:   {report['mean_abs_prob_delta']:.4f} / {report['max_abs_prob_delta']:.4f}")
+
+    save_quantized(output, qmodel, engine, report)
+    report_path = output[:-len(".pth")] + ".json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Saved INT8 model to {output}")
+    print(f"📄 Report: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
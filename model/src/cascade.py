@@ -0,0 +1,153 @@
+import threading
+
+import torch
+import torch.nn as nn
+
+LIGHT_BRANCHES = ("freq", "patch")
+HEAVY_BRANCHES = ("rgb", "vit")
+
+
+class CascadeHead(nn.Module):
+    """Small auxiliary classifier on the light (frequency + patch) features"""
+
+    def __init__(self, input_dim, hidden_dim=64):
+        super().__init__()
+        self.input_dim = input_dim
+        self.net = nn.Sequential(
+            nn.Linear(input_dim, hidden_dim),
+            nn.ReLU(),
+            nn.Linear(hidden_dim, 1)
+        )
+
+    def forward(self, light_feat):
+        return self.net(light_feat)
+
+
+def light_features(detector, x):
+    """
+    Run only the light branches.
+
+    Returns:
+        tuple: (dict of light features, their concatenation (B, light_dim), patch grid or None)
+    """
+    feats, patch_grid = detector.branch_features(x, skip=HEAVY_BRANCHES)
+    return feats, torch.cat([feats[name].float() for name in LIGHT_BRANCHES if name in feats], dim=1), patch_grid
+
+
+class CascadeDetector(nn.Module):
+    """
+    Confidence-gated inference: cheap branches first, heavy backbones only when needed.
+
+    The frequency and patch branches (a few MFLOPs) plus a CascadeHead give an early
+    fake probability for every input. Inputs whose early probability falls inside the
+    uncertain band [low, high] are escalated: the RGB (EfficientNetV2-S) and ViT
+    (Swin-V2-T) branches run for those rows only, and the full fusion head decides,
+    exactly as in DeepfakeDetector.forward. Everything outside the band is answered
+    by the early score. Pick the band with calibrate_cascade.py.
+
+    Args:
+        detector (DeepfakeDetector): Full model (needs at least one light and one heavy branch)
+        head (CascadeHead): Trained auxiliary head
+        low, high (float): Uncertain band of the early probability
+    """
+
+    def __init__(self, detector, head, low=0.1, high=0.9):
+        super().__init__()
+        if not any(name in detector.branch_names for name in LIGHT_BRANCHES):
+            raise ValueError("Cascade needs the frequency or patch branch enabled")
+        if not any(name in detector.branch_names for name in HEAVY_BRANCHES):
+            raise ValueError("Cascade needs the RGB or ViT branch enabled")
+        self.detector = detector
+        self.head = head
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        self._items = 0
+        self._escalated = 0
+
+    def cascade_forward(self, x, return_patch_map=False):
+        """
+        Returns:
+            tuple: (logits (B, 1), patch logits (B, H_grid, W_grid) or None, escalated mask (B,)).
+                   Patch logits are only meaningful for escalated rows (they need the full
+                   fused vector); rows answered early have no patch map.
+        """
+        feats, light, patch_grid = light_features(self.detector, x)
+        logits = self.head(light)
+
+        prob = torch.sigmoid(logits).view(-1)
+        escalated = (prob >= self.low) & (prob <= self.high)
+        patch_logits = None
+
+        index = escalated.nonzero(as_tuple=True)[0]
+        if index.numel() > 0:
+            heavy, _ = self.detector.branch_features(x[index], skip=LIGHT_BRANCHES)
+            for name, feat in feats.items():
+                heavy[name] = feat[index]
+            combined = self.detector.fuse(heavy)
+            logits = logits.clone()
+            logits[index] = self.detector.classifier(combined).to(logits.dtype)
+
+            if return_patch_map and patch_grid is not None:
+                patch_logits = torch.zeros(patch_grid.shape[:3], dtype=logits.dtype, device=logits.device)
+                patch_logits[index] = self.detector.patch_scores(combined, patch_grid[index]).to(logits.dtype)
+
+        with self._lock:
+            self._items += x.shape[0]
+            self._escalated += int(index.numel())
+        return logits, patch_logits, escalated
+
+    def forward(self, x):
+        logits, _, _ = self.cascade_forward(x)
+        return logits
+
+    def predict_with_patch_map(self, x):
+        """Same contract as DeepfakeDetector.predict_with_patch_map, with None for rows answered early"""
+        with torch.no_grad():
+            logits, patch_logits, escalated = self.cascade_forward(x, return_patch_map=True)
+        if patch_logits is None:
+            return logits, None
+        maps = torch.sigmoid(patch_logits).float().cpu().numpy()
+        return logits, [m if e else None for m, e in zip(maps, escalated.tolist())]
+
+    @property
+    def precision(self):
+        return self.detector.precision
+
+    @property
+    def supports_precision(self):
+        return self.detector.supports_precision
+
+    def set_precision(self, precision="fp32"):
+        """Precision of the light and heavy branches (see DeepfakeDetector.set_precision)"""
+        self.detector.set_precision(precision)
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {
+                "band": [self.low, self.high],
+                "items": self._items,
+                "escalated": self._escalated,
+                "escalation_rate": round(self._escalated / self._items, 4) if self._items else None
+            }
+
+
+def save_cascade(path, head, low, high, report=None):
+    """Save the auxiliary head and its calibrated band in one file"""
+    torch.save({
+        "state_dict": head.state_dict(),
+        "input_dim": head.input_dim,
+        "low": float(low),
+        "high": float(high),
+        "report": report or {}
+    }, path)
+
+
+def load_cascade(detector, path, device="cpu"):
+    """Build a CascadeDetector around an already-loaded detector from a save_cascade file"""
+    saved = torch.load(path, map_location=device)
+    head = CascadeHead(saved["input_dim"])
+    head.load_state_dict(saved["state_dict"])
+    head.to(device).eval()
+    return CascadeDetector(detector, head, saved["low"], saved["high"]).eval()
@@ -12,11 +12,16 @@ class Config:
     IMAGE_SIZE = 256
     NUM_CLASSES = 1  # Logic: 0=Real, 1=Fake (Sigmoid output)
     
-    # Component Flags
-    USE_RGB = True
-    USE_FREQ = True
-    USE_PATCH = True
-    USE_VIT = True
+    # Component Flags (disabled branches are not built or run; override with e.g. USE_VIT=0)
+    USE_RGB = os.environ.get("USE_RGB", "1") == "1"
+    USE_FREQ = os.environ.get("USE_FREQ", "1") == "1"
+    USE_PATCH = os.environ.get("USE_PATCH", "1") == "1"
+    USE_VIT = os.environ.get("USE_VIT", "1") == "1"
+    
+    # Run the enabled branches concurrently (one worker thread each, intra-op threads split
+    # between them). Helps batch-1 CPU latency; BRANCH_THREADS=0 splits torch.get_num_threads()
+    PARALLEL_BRANCHES = os.environ.get("PARALLEL_BRANCHES", "0") == "1"
+    BRANCH_THREADS = int(os.environ.get("BRANCH_THREADS", 0))
     
     # Training Hyperparameters
     BATCH_SIZE = 32  # Optimized for Mac M4 (Unified Memory)
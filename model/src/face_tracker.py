@@ -0,0 +1,137 @@
+import time
+
+import cv2
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Follows the main face through a video without running Haar detection on every frame.
+
+    Detection runs on a frame downscaled to `detect_width` pixels, every `detect_every`
+    calls or as soon as the track is lost. In between, the face template from the last
+    detection is located by normalised cross-correlation in a small window around the
+    previous box. After a detection that finds no face, the next `detect_every` calls
+    return None without detecting, so faceless stretches cost one detection per interval. When several faces are detected the one overlapping the current track
+    (IoU) is kept, otherwise the largest. Frames must be passed in order.
+
+    Args:
+        cascade (cv2.CascadeClassifier): Face detector.
+        detect_every (int): Maximum number of frames between two detections.
+        detect_width (int): Width of the frame used for detection and tracking.
+        match_threshold (float): Minimum template-match score to keep the track.
+    """
+
+    def __init__(self, cascade, detect_every=10, detect_width=480, match_threshold=0.6, min_face=60):
+        self.cascade = cascade
+        self.detect_every = max(1, detect_every)
+        self.detect_width = detect_width
+        self.match_threshold = match_threshold
+        self.min_face = min_face
+
+        self.box = None       # Current track in downscaled coordinates
+        self.template = None
+        self.since_detect = 0
+
+        self.detections = 0
+        self.tracked = 0
+        self.lost = 0
+        self.skipped = 0
+        self.detect_seconds = 0.0
+        self.track_seconds = 0.0
+
+    def stats(self):
+        return {
+            "detections": self.detections,
+            "tracked_frames": self.tracked,
+            "tracks_lost": self.lost,
+            "skipped_frames": self.skipped,
+            "detect_seconds": round(self.detect_seconds, 3),
+            "track_seconds": round(self.track_seconds, 3)
+        }
+
+    def locate(self, frame):
+        """Return the face box (x, y, w, h) in full-resolution coordinates, or None"""
+        if self.box is None and self.detections > 0 and self.since_detect < self.detect_every:
+            # The last detection found no face: wait for the next interval
+            self.since_detect += 1
+            self.skipped += 1
+            return None
+
+        scale = min(1.0, self.detect_width / frame.shape[1])
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        box = None
+        if self.box is not None and self.since_detect < self.detect_every:
+            box = self._track(gray)
+            if box is None:
+                self.lost += 1
+
+        if box is None:
+            box = self._detect(gray, scale)
+
+        if box is None:
+            return None
+        x, y, w, h = box
+        return (int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+
+    def _detect(self, gray, scale):
+        start = time.perf_counter()
+        self.detections += 1
+        self.since_detect = 0
+        min_size = max(20, int(self.min_face * scale))
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size))
+
+        box = None
+        if len(faces) > 0:
+            faces = [tuple(int(v) for v in f) for f in faces]
+            if self.box is not None:
+                best = max(faces, key=lambda f: box_iou(f, self.box))
+                if box_iou(best, self.box) > 0.3:
+                    box = best
+            if box is None:
+                # Find largest face
+                box = max(faces, key=lambda rect: rect[2] * rect[3])
+
+        self.box = box
+        self.template = None
+        if box is not None:
+            x, y, w, h = box
+            self.template = gray[y:y + h, x:x + w].copy()
+        self.detect_seconds += time.perf_counter() - start
+        return box
+
+    def _track(self, gray):
+        start = time.perf_counter()
+        x, y, w, h = self.box
+        # Search window: the previous box grown by half its size on each side
+        pad_x, pad_y = w // 2, h // 2
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+        window = gray[y0:y1, x0:x1]
+
+        box = None
+        if window.shape[0] >= h and window.shape[1] >= w:
+            scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (mx, my) = cv2.minMaxLoc(scores)
+            if score >= self.match_threshold:
+                box = (x0 + mx, y0 + my, w, h)
+
+        if box is not None:
+            # A lost track keeps its last box so the next detection can be matched against it
+            self.box = box
+            self.since_detect += 1
+            self.tracked += 1
+        self.track_seconds += time.perf_counter() - start
+        return box
@@ -0,0 +1,144 @@
+import json
+import subprocess
+
+import numpy as np
+
+
+def scaled_size(width, height, max_width=640):
+    """Output size that fits max_width, keeps the aspect ratio and has even dimensions"""
+    if width <= max_width:
+        out_w, out_h = width, height
+    else:
+        out_w, out_h = max_width, round(height * max_width / width)
+    return max(2, out_w - out_w % 2), max(2, out_h - out_h % 2)
+
+
+def iter_ffmpeg_frames(video_path, step, width, height, max_width=640):
+    """
+    Drop-in alternative to iter_sampled_frames that lets ffmpeg do the heavy lifting.
+
+    ffmpeg keeps every `step`-th decoded frame with a select filter, downscales it with a
+    scale filter and converts it to packed BGR, then writes raw frames to a pipe. Each
+    frame is read straight into a numpy buffer, so Python never touches full-resolution
+    pixels. Frames are passed through without frame-rate conversion, so the k-th output
+    frame is source frame k * step, as with the OpenCV sampler, and a video of N frames
+    yields ceil(N / step) of them.
+
+    Args:
+        video_path (str): Video file.
+        step (int): Sampling interval in source frames.
+        width, height (int): Displayed frame size, i.e. after rotation metadata is applied
+                             (see probe_video_stream; ffmpeg auto-rotates before the filters).
+        max_width (int): Frames wider than this are downscaled.
+
+    Yields:
+        (frame_index, bgr_frame) with bgr_frame of shape (h, w, 3), dtype uint8.
+    """
+    out_w, out_h = scaled_size(width, height, max_width)
+    frame_bytes = out_w * out_h * 3
+
+    cmd = [
+        'ffmpeg', '-v', 'error', '-nostdin',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', f"select=not(mod(n\\,{step})),scale={out_w}:{out_h}:flags=area",
+        '-vsync', 'passthrough',
+        '-pix_fmt', 'bgr24',
+        '-f', 'rawvideo', 'pipe:1'
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=frame_bytes * 2)
+    try:
+        k = 0
+        while True:
+            frame = np.empty((out_h, out_w, 3), dtype=np.uint8)
+            view = memoryview(frame).cast('B')
+            filled = 0
+            while filled < frame_bytes:
+                n = proc.stdout.readinto(view[filled:])
+                if not n:
+                    return
+                filled += n
+            yield k * step, frame
+            k += 1
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def probe_video_stream(video_path, count_frames=False):
+    """
+    Displayed size, duration and frame count of the first video stream as ffprobe reads
+    them from the container (the same demuxer iter_ffmpeg_frames decodes through).
+
+    Rotation metadata (a "rotate" tag or a display-matrix side data entry) of 90/270
+    degrees swaps width and height, as ffmpeg's auto-rotation does.
+
+    Args:
+        video_path (str): Video file.
+        count_frames (bool): Count the stream's packets (demuxing only, no decoding); the
+                             count is preferred over the header's nb_frames, which many
+                             containers leave empty.
+
+    Returns:
+        dict with 'width', 'height', 'rotation', 'duration' (seconds) and 'frames' (None
+        if unknown), or None when ffprobe is unavailable or finds no video stream.
+    """
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height,duration,nb_frames,nb_read_packets'
+                         ':stream_tags=rotate:stream_side_data=rotation:format=duration',
+        '-of', 'json',
+        video_path
+    ]
+    if count_frames:
+        cmd.insert(-1, '-count_packets')
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120 if count_frames else 30)
+        if result.returncode != 0:
+            return None
+        info = json.loads(result.stdout)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+    streams = info.get('streams') or []
+    if not streams or not streams[0].get('width') or not streams[0].get('height'):
+        return None
+    stream = streams[0]
+
+    rotation = 0
+    candidates = [stream.get('tags', {}).get('rotate')]
+    candidates += [entry.get('rotation') for entry in stream.get('side_data_list', [])]
+    for value in candidates:
+        try:
+            rotation = int(float(value)) % 360
+            break
+        except (TypeError, ValueError):
+            continue
+
+    width, height = int(stream['width']), int(stream['height'])
+    if rotation % 180 == 90:
+        width, height = height, width
+
+    duration = None
+    for value in (stream.get('duration'), info.get('format', {}).get('duration')):
+        try:
+            duration = float(value)
+        except (TypeError, ValueError):
+            continue
+        if duration > 0:
+            break
+        duration = None
+
+    frames = None
+    for value in (stream.get('nb_read_packets'), stream.get('nb_frames')):
+        try:
+            frames = int(value)
+        except (TypeError, ValueError):
+            continue
+        if frames > 0:
+            break
+        frames = None
+
+    return {'width': width, 'height': height, 'rotation': rotation, 'duration': duration, 'frames': frames}
@@ -10,8 +10,10 @@ ssl._create_default_https_context = ssl._create_unverified_context
 
 import albumentations as A
 from albumentations.pytorch import ToTensorV2
-from src.models import DeepfakeDetector
+from src.models import DeepfakeDetector, PRECISIONS
 from src.config import Config
+from src.quantization import is_int8_checkpoint, load_quantized
+from src.onnx_runtime import OnnxDetector, is_onnx_model
 
 try:
     from safetensors.torch import load_file
@@ -26,10 +28,11 @@ def get_transform():
         ToTensorV2(),
     ])
 
-def load_models(checkpoints_arg, device):
+def load_models(checkpoints_arg, device, precision="fp32"):
     """
     Load one or multiple models for ensemble inference.
     checkpoints_arg: Comma-separated list of paths, or single path, or directory.
+    precision: Inference precision of the eager fp32 models (see DeepfakeDetector.set_precision).
     """
     paths = []
     if os.path.isdir(checkpoints_arg):
@@ -47,6 +50,25 @@ def load_models(checkpoints_arg, device):
         if not path: continue
         
         print(f"Loading: {path}")
+        if is_onnx_model(path):
+            # Exported with export_onnx.py, run by ONNX Runtime on CPU
+            try:
+                models.append(OnnxDetector(path))
+                print(f"✅ Successfully loaded ONNX model: {os.path.basename(path)}")
+            except Exception as e:
+                print(f"❌ Failed to load {path}: {e}")
+            continue
+        
+        if is_int8_checkpoint(path):
+            # Quantized models (quantize_model.py) are complete and CPU-only
+            try:
+                model, _ = load_quantized(path)
+                models.append(model)
+                print(f"✅ Successfully loaded INT8 model: {os.path.basename(path)}")
+            except Exception as e:
+                print(f"❌ Failed to load {path}: {e}")
+            continue
+        
         model = DeepfakeDetector(pretrained=False) # Structure only
         model.to(device)
         model.eval()
@@ -57,6 +79,7 @@ def load_models(checkpoints_arg, device):
             else:
                 state_dict = torch.load(path, map_location=device)
             model.load_state_dict(state_dict)
+            model.set_precision(precision)
             models.append(model)
             print(f"✅ Successfully loaded: {os.path.basename(path)}")
         except Exception as e:
@@ -88,7 +111,8 @@ def predict_ensemble(models, image_path, device, transform):
     probs = []
     with torch.no_grad():
         for model in models:
-            logits = model(image_tensor)
+            # INT8 models stay on CPU whatever the device of the others
+            logits = model(image_tensor.cpu() if model.quantized else image_tensor)
             prob = torch.sigmoid(logits).item()
             probs.append(prob)
             
@@ -101,13 +125,14 @@ def main():
     parser.add_argument("--source", type=str, required=True, help="Path to image or directory")
     parser.add_argument("--checkpoints", type=str, default="results/checkpoints", help="Path to checkpoint file, list of files (comma-separated), or directory")
     parser.add_argument("--device", type=str, default=Config.DEVICE, help="Device to use (cuda/mps/cpu)")
+    parser.add_argument("--precision", type=str, default="fp32", choices=PRECISIONS, help="Inference precision (bf16 / channels_last for modern CPUs)")
     args = parser.parse_args()
     
     device = torch.device(args.device)
     print(f"Using device: {device}")
     
     # Load Models
-    models = load_models(args.checkpoints, device)
+    models = load_models(args.checkpoints, device, precision=args.precision)
     transform = get_transform()
     
     # Process Source
@@ -1,10 +1,26 @@
+import contextlib
+import functools
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import torchvision.models as models
 import numpy as np
+from src.config import Config
 from src.utils import get_fft_feature
 
+# Branch order in the fused feature vector, and each branch's width in the full four-branch model
+BRANCH_NAMES = ("rgb", "freq", "patch", "vit")
+FULL_FEATURE_DIMS = {"rgb": 1280, "freq": 128, "patch": 64, "vit": 768}
+# Relative cost of each branch, used to split intra-op threads when branches run concurrently
+BRANCH_THREAD_WEIGHTS = {"rgb": 6, "freq": 1, "patch": 1, "vit": 6}
+# Inference precision modes, see DeepfakeDetector.set_precision
+PRECISIONS = ("fp32", "bf16", "channels_last", "bf16+channels_last")
+
 class RGBBranch(nn.Module):
     def __init__(self, pretrained=True):
         super().__init__()
@@ -66,6 +82,16 @@ class PatchBranch(nn.Module):
         self.out_dim = 64
 
     def forward(self, x):
+        feats_max, _ = self.forward_with_patches(x)
+        return feats_max
+
+    def forward_with_patches(self, x):
+        """
+        Same as forward, but also returns the per-patch features before max-pooling.
+
+        Returns:
+            tuple: (pooled features (B, 64), patch features (B, H_grid, W_grid, 64))
+        """
         # x: (B, 3, 256, 256)
         # Create 4x4=16 patches of size 64x64
         # Unfold logic: kernel_size=64, stride=64
@@ -87,7 +113,7 @@ class PatchBranch(nn.Module):
         # Max pool over patches to capture the "most fake" patch signal
         feats_max, _ = torch.max(feats, dim=1) # (B, 64)
         
-        return feats_max
+        return feats_max, feats.view(B, H_grid, W_grid, -1)
 
 class ViTBranch(nn.Module):
     def __init__(self, pretrained=True):
@@ -104,17 +130,40 @@ class ViTBranch(nn.Module):
         return self.net(x)
 
 class DeepfakeDetector(nn.Module):
-    def __init__(self, pretrained=True):
+    def __init__(self, pretrained=True, use_rgb=None, use_freq=None, use_patch=None, use_vit=None,
+                 parallel_branches=None):
+        """
+        Args:
+            pretrained (bool): Start the RGB and ViT backbones from ImageNet weights.
+            use_rgb, use_freq, use_patch, use_vit (bool): Build and run this branch
+                (default: Config.USE_RGB / USE_FREQ / USE_PATCH / USE_VIT). Disabled branches
+                are not constructed at all and the fusion head only sees the enabled ones.
+            parallel_branches (bool): Run the branches concurrently (default: Config.PARALLEL_BRANCHES).
+                See set_parallel_branches.
+        """
         super().__init__()
-        self.rgb_branch = RGBBranch(pretrained)
-        self.freq_branch = FreqBranch()
-        self.patch_branch = PatchBranch()
-        self.vit_branch = ViTBranch(pretrained)
+        enabled = {
+            "rgb": Config.USE_RGB if use_rgb is None else use_rgb,
+            "freq": Config.USE_FREQ if use_freq is None else use_freq,
+            "patch": Config.USE_PATCH if use_patch is None else use_patch,
+            "vit": Config.USE_VIT if use_vit is None else use_vit,
+        }
+        if not any(enabled.values()):
+            raise ValueError("DeepfakeDetector needs at least one branch enabled")
+
+        self.rgb_branch = RGBBranch(pretrained) if enabled["rgb"] else None
+        self.freq_branch = FreqBranch() if enabled["freq"] else None
+        self.patch_branch = PatchBranch() if enabled["patch"] else None
+        self.vit_branch = ViTBranch(pretrained) if enabled["vit"] else None
+        self.branch_names = [name for name in BRANCH_NAMES if enabled[name]]
         
-        input_dim = (self.rgb_branch.out_dim + 
-                     self.freq_branch.out_dim + 
-                     self.patch_branch.out_dim + 
-                     self.vit_branch.out_dim)
+        # Position of each enabled branch in the fused feature vector
+        self.feature_slices = {}
+        input_dim = 0
+        for name in self.branch_names:
+            out_dim = getattr(self, f"{name}_branch").out_dim
+            self.feature_slices[name] = slice(input_dim, input_dim + out_dim)
+            input_dim += out_dim
         
         # Confidence-based fusion head
         self.classifier = nn.Sequential(
@@ -125,73 +174,430 @@ class DeepfakeDetector(nn.Module):
             nn.Linear(512, 1)
         )
         
-    def forward(self, x):
-        # 1. Spatial Analysis
-        rgb_feat = self.rgb_branch(x)
+        # Position of the patch features in the fused vector (see patch_scores)
+        self.patch_slice = self.feature_slices.get("patch")
         
-        # 2. Frequency Analysis
-        freq_img = get_fft_feature(x)
-        freq_feat = self.freq_branch(freq_img)
+        self.parallel_branches = Config.PARALLEL_BRANCHES if parallel_branches is None else parallel_branches
+        self.branch_threads = Config.BRANCH_THREADS or None
+        # Set by src.quantization.quantize_detector (INT8 modules have no gradients)
+        self.quantized = False
+        self.precision = "fp32"
+        self.bf16 = False
+        self.channels_last = False
+
+    @property
+    def supports_gradcam(self):
+        """Grad-CAM needs the RGB branch and a backward pass through it"""
+        return self.rgb_branch is not None and not self.quantized
+
+    @property
+    def supports_precision(self):
+        """set_precision modes other than fp32 need the eager fp32 modules"""
+        return not self.quantized
+
+    def set_parallel_branches(self, enabled=True, threads=None):
+        """
+        Switch between sequential and concurrent branch execution.
+
+        Concurrent mode gives each branch its own worker thread with a share of the
+        intra-op threads (by BRANCH_THREAD_WEIGHTS), so batch-1 CPU inference keeps all
+        cores busy instead of running four under-filled kernels one after another.
+
+        Args:
+            enabled (bool): Run branches concurrently
+            threads (int): Intra-op threads to split between branches (default: torch.get_num_threads())
+        """
+        self.parallel_branches = enabled
+        self.branch_threads = threads
+        _drop_branch_executor(self)
+        return self
+
+    def set_precision(self, precision="fp32"):
+        """
+        Choose the numeric mode of inference (forward, patch maps, and the cascade and
+        video scoring built on them). Grad-CAM always runs in fp32.
+
+        - "fp32": contiguous fp32 (default)
+        - "bf16": bf16 autocast; convolutions and matmuls run in bf16, outputs are fp32
+        - "channels_last": NHWC weights and inputs, fp32
+        - "bf16+channels_last": both
+
+        Speedups depend on the CPU (AVX-512 BF16 / AMX for bf16); measure the drift against
+        fp32 with check_precision_drift.py before enabling a mode on a host type.
+
+        Args:
+            precision (str): One of PRECISIONS
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {', '.join(PRECISIONS)}")
+        if self.quantized and precision != "fp32":
+            raise ValueError("INT8 models run in their own precision")
+        self.channels_last = "channels_last" in precision
+        self.bf16 = precision.startswith("bf16")
+        self.to(memory_format=torch.channels_last if self.channels_last else torch.contiguous_format)
+        self.precision = precision
+        return self
+
+    def precision_context(self):
+        """bf16 autocast on the model's device in bf16 modes, otherwise a no-op"""
+        if not self.bf16:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=next(self.parameters()).device.type, dtype=torch.bfloat16)
         
-        # 3. Patch Analysis (Local Inconsistencies)
-        patch_feat = self.patch_branch(x)
+    def forward(self, x, return_patch_map=False):
+        """
+        Args:
+            x (torch.Tensor): Input images of shape (B, C, H, W)
+            return_patch_map (bool): Also return per-patch logits of shape (B, H_grid, W_grid),
+                                     computed from the same forward pass (see patch_scores).
+                                     None when the patch branch is disabled.
+        """
+        feats, patch_grid = self.branch_features(x)
         
-        # 4. Global Consistency (ViT)
-        vit_feat = self.vit_branch(x)
+        with self.precision_context():
+            # 5. Feature Fusion
+            combined = self.fuse(feats)
+            
+            logits = self.classifier(combined).float()
+            if return_patch_map:
+                return logits, self.patch_scores(combined, patch_grid).float() if patch_grid is not None else None
+        return logits
+
+    def branch_features(self, x, skip=(), reduced_precision=True, parallel=None):
+        """
+        Run the enabled branches (except those named in skip).
+
+        Args:
+            reduced_precision (bool): Run the branches in the mode chosen with set_precision
+                (False: always fp32). Autocast is entered inside each branch task, because
+                autocast state, like grad mode, does not carry over to the branch worker threads.
+            parallel (bool): Override parallel_branches for this call (False keeps every
+                branch on the calling thread, which get_heatmap's hook relies on)
+
+        Returns:
+            tuple: (dict of branch name -> (B, out_dim) features, patch grid or None)
+        """
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        tasks = OrderedDict()
         
-        # 5. Feature Fusion
-        combined = torch.cat([rgb_feat, freq_feat, patch_feat, vit_feat], dim=1)
+        # 1. Spatial Analysis
+        if self.rgb_branch is not None and "rgb" not in skip:
+            tasks["rgb"] = lambda: self.rgb_branch(x)
         
-        return self.classifier(combined)
-
-    def get_heatmap(self, x):
-        """Generate Grad-CAM heatmap for the input image"""
-        # We'll use the RGB branch for visualization as it contains spatial features
-        # Enable gradients for the input if needed, though typically we hook into layers
+        # 2. Frequency Analysis
+        if self.freq_branch is not None and "freq" not in skip:
+            tasks["freq"] = lambda: self.freq_branch(get_fft_feature(x))
         
-        # 1. Forward pass through RGB branch
-        # We need to register a hook on the last conv layer of the efficientnet features
-        # Target layer: self.rgb_branch.features[-1] (the last block)
+        # 3. Patch Analysis (Local Inconsistencies)
+        if self.patch_branch is not None and "patch" not in skip:
+            tasks["patch"] = lambda: self.patch_branch.forward_with_patches(x)
         
-        gradients = []
-        activations = []
+        # 4. Global Consistency (ViT)
+        if self.vit_branch is not None and "vit" not in skip:
+            tasks["vit"] = lambda: self.vit_branch(x)
         
-        def backward_hook(module, grad_input, grad_output):
-            gradients.append(grad_output[0])
-            
-        def forward_hook(module, input, output):
-            activations.append(output)
-            
-        # Register hooks on the last convolutional layer of RGB branch
-        target_layer = self.rgb_branch.features[-1]
-        hook_b = target_layer.register_full_backward_hook(backward_hook)
-        hook_f = target_layer.register_forward_hook(forward_hook)
-        
-        # Forward pass
-        logits = self(x)
-        pred_idx = 0 # Binary classification, output is scalar logic
-        
-        # Backward pass
-        self.zero_grad()
-        logits.backward(retain_graph=True)
-        
-        # Get gradients and activations
-        pooled_gradients = torch.mean(gradients[0], dim=[0, 2, 3])
-        activation = activations[0][0]
-        
-        # Weight activations by gradients (Grad-CAM)
-        for i in range(activation.shape[0]):
-            activation[i, :, :] *= pooled_gradients[i]
-            
-        heatmap = torch.mean(activation, dim=0).cpu().detach().numpy()
-        heatmap = np.maximum(heatmap, 0) # ReLU
+        context = self.precision_context if reduced_precision else contextlib.nullcontext
+        for name, task in tasks.items():
+            tasks[name] = functools.partial(_run_in, context, task)
         
-        # Normalize
-        if np.max(heatmap) != 0:
-            heatmap /= np.max(heatmap)
-            
-        # Remove hooks
-        hook_b.remove()
-        hook_f.remove()
+        if parallel is None:
+            parallel = self.parallel_branches
+        if parallel and len(tasks) > 1:
+            results = _branch_executor(self).run(tasks)
+        else:
+            results = {name: task() for name, task in tasks.items()}
         
-        return heatmap
+        patch_grid = None
+        if "patch" in results:
+            results["patch"], patch_grid = results["patch"]
+        return results, patch_grid
+
+    def fuse(self, feats):
+        """
+        Concatenate per-branch features (dict from branch_features) in fused-vector order.
+        Always fp32, whatever precision the branches ran in.
+        """
+        return torch.cat([feats[name].float() for name in self.branch_names], dim=1)
+
+    def adapt_state_dict(self, state_dict):
+        """
+        Map a checkpoint onto this model's branch subset.
+
+        Weights of disabled branches are dropped. If the checkpoint's fusion head was
+        trained on all four branches, only the input columns of its first Linear layer
+        that belong to the enabled branches are kept. The removed branches' contribution
+        is simply left out, so fine-tune the head of a subset model for best accuracy.
+        """
+        disabled = [name for name in BRANCH_NAMES if name not in self.branch_names]
+        if not disabled:
+            return state_dict
+
+        adapted = OrderedDict(
+            (key, value) for key, value in state_dict.items()
+            if not any(key.startswith(f"{name}_branch.") for name in disabled)
+        )
+        metadata = getattr(state_dict, "_metadata", None)
+        if metadata is not None:
+            adapted._metadata = metadata
+
+        weight = adapted.get("classifier.0.weight")
+        if weight is not None and weight.shape[1] == sum(FULL_FEATURE_DIMS.values()):
+            columns = []
+            offset = 0
+            for name in BRANCH_NAMES:
+                width = FULL_FEATURE_DIMS[name]
+                if name in self.branch_names:
+                    columns.append(weight[:, offset:offset + width])
+                offset += width
+            adapted["classifier.0.weight"] = torch.cat(columns, dim=1).contiguous()
+        return adapted
+
+    def load_state_dict(self, state_dict, *args, **kwargs):
+        """nn.Module.load_state_dict that also accepts full checkpoints for branch subsets (see adapt_state_dict)"""
+        return super().load_state_dict(self.adapt_state_dict(state_dict), *args, **kwargs)
+
+    def patch_scores(self, combined, patch_grid):
+        """
+        Per-patch suspiciousness derived from the trained head, without a backward pass.
+
+        Each patch is scored by swapping its own features in for the max-pooled patch
+        features and running the fused vector through the classifier, with the RGB,
+        frequency and ViT features left unchanged: "what would the logit be if this patch
+        were the one driving the patch branch". All B * H_grid * W_grid variants go
+        through the (small) classifier as one batch.
+
+        Args:
+            combined (torch.Tensor): Fused features (B, input_dim) from the forward pass
+            patch_grid (torch.Tensor): Patch features (B, H_grid, W_grid, patch_dim)
+        Returns:
+            torch.Tensor: Patch logits of shape (B, H_grid, W_grid)
+        """
+        B, H_grid, W_grid, D = patch_grid.shape
+        variants = combined.unsqueeze(1).repeat(1, H_grid * W_grid, 1)
+        variants[:, :, self.patch_slice] = patch_grid.reshape(B, H_grid * W_grid, D)
+        scores = self.classifier(variants.view(B * H_grid * W_grid, -1))
+        return scores.view(B, H_grid, W_grid)
+
+    def predict_with_patch_map(self, x):
+        """
+        Prediction plus a coarse localisation map from one forward pass (no gradients).
+
+        Much cheaper than Grad-CAM (predict_with_heatmap / get_heatmap), at patch-grid
+        resolution (4x4 for 256px inputs). Map values are per-patch fake probabilities,
+        not normalised per image, so a clean image stays cold.
+
+        Args:
+            x (torch.Tensor): Input images of shape (B, C, H, W)
+        Returns:
+            tuple: (logits of shape (B, 1), maps as np.ndarray of shape (B, H_grid, W_grid) in [0, 1],
+                    or None when the patch branch is disabled)
+        """
+        with torch.no_grad():
+            logits, patch_logits = self(x, return_patch_map=True)
+        if patch_logits is None:
+            return logits, None
+        return logits, torch.sigmoid(patch_logits).float().cpu().numpy()
+
+    def predict_with_heatmap(self, x):
+        """
+        Single-pass prediction plus Grad-CAM heatmap.
+
+        All four branches run once without autograd. Grad-CAM only needs the
+        gradient of the logit w.r.t. the last RGB feature map, so the backward
+        pass covers just avgpool + classifier instead of the whole network.
+        Must not be called inside torch.inference_mode().
+
+        Args:
+            x (torch.Tensor): Input images of shape (B, C, H, W)
+        Returns:
+            tuple: (logits of shape (B, 1), heatmaps as np.ndarray of shape (B, h, w) in [0, 1])
+        """
+        if self.rgb_branch is None:
+            raise ValueError("Grad-CAM needs the RGB branch (Config.USE_RGB)")
+
+        with torch.no_grad():
+            activation = self.rgb_branch.features(x)
+            feats, _ = self.branch_features(x, skip=("rgb",), reduced_precision=False)
+
+        activation = activation.detach().requires_grad_(True)
+        with torch.enable_grad():
+            feats["rgb"] = torch.flatten(self.rgb_branch.avgpool(activation), 1)
+            combined = self.fuse(feats)
+            logits = self.classifier(combined)
+            # Samples are independent in eval mode, so one backward of the sum gives per-sample gradients
+            gradients, = torch.autograd.grad(logits.sum(), activation)
+
+        heatmaps = self._grad_cam(activation.detach(), gradients)
+        return logits.detach(), heatmaps
+
+    @staticmethod
+    def _grad_cam(activation, gradients):
+        """Weight (B, C, h, w) activations by their pooled gradients and normalise each map to [0, 1]"""
+        weights = gradients.mean(dim=(2, 3), keepdim=True)
+        cam = torch.relu((activation * weights).mean(dim=1))
+        peak = cam.flatten(1).max(dim=1).values.view(-1, 1, 1)
+        cam = torch.where(peak > 0, cam / peak.clamp_min(1e-12), cam)
+        return cam.cpu().numpy()
+
+    def get_heatmap(self, x, target_layer=None):
+        """
+        Grad-CAM heatmaps for a whole batch from one forward and one backward pass.
+
+        Unlike predict_with_heatmap, the gradient is taken through the full network, so
+        any layer of the RGB backbone can be explained. The forward hook on the target
+        layer is registered once and stays in place, but only records outputs for the
+        thread that is inside this call; forwards running concurrently in other threads
+        (batched predictions, video scans) pass through it untouched. The branches run
+        on the calling thread for the same reason.
+        Must not be called inside torch.inference_mode().
+
+        Args:
+            x (torch.Tensor): Input images of shape (B, C, H, W)
+            target_layer (nn.Module): Layer to explain (default: last block of the RGB features)
+        Returns:
+            np.ndarray: Heatmaps of shape (B, h, w) in [0, 1], one per input image
+        """
+        if target_layer is None:
+            if self.rgb_branch is None:
+                raise ValueError("Grad-CAM needs the RGB branch (Config.USE_RGB) or an explicit target_layer")
+            target_layer = self.rgb_branch.features[-1]
+        _register_gradcam_hook(target_layer)
+
+        captures = {id(target_layer): None}
+        _gradcam_local.captures = captures
+        try:
+            with torch.enable_grad():
+                # fp32 whatever set_precision chose, like predict_with_heatmap
+                feats, _ = self.branch_features(x, reduced_precision=False, parallel=False)
+                logits = self.classifier(self.fuse(feats))
+                activation = captures[id(target_layer)]
+                if activation is None:
+                    raise ValueError("target_layer is not part of this model's forward pass")
+                # Samples are independent in eval mode, so one backward of the sum gives per-sample gradients
+                gradients, = torch.autograd.grad(logits.sum(), activation)
+        finally:
+            _gradcam_local.captures = None
+
+        return self._grad_cam(activation.detach(), gradients)
+
+
+# Per-thread Grad-CAM state: {id(layer): output} for the get_heatmap call running in this
+# thread, None otherwise. Other threads' forwards never see it.
+_gradcam_local = threading.local()
+
+
+def _gradcam_hook(module, inputs, output):
+    """Forward hook that hands the target layer's output to the get_heatmap call in this thread"""
+    captures = getattr(_gradcam_local, "captures", None)
+    if not captures or id(module) not in captures:
+        return None
+    if not output.requires_grad:
+        # Frozen (or no_grad-loaded) weights: start the graph here so the gradient still exists
+        output = output.detach().requires_grad_(True)
+    captures[id(module)] = output
+    return output
+
+
+# The hook is a plain module-level function holding no state, so a hooked model can still be
+# deep-copied (quantize_detector) and pickled; copies keep the hook but never match a capture
+_gradcam_hooked = weakref.WeakSet()
+_gradcam_hooked_lock = threading.Lock()
+
+
+def _register_gradcam_hook(layer):
+    with _gradcam_hooked_lock:
+        if layer not in _gradcam_hooked:
+            layer.register_forward_hook(_gradcam_hook)
+            _gradcam_hooked.add(layer)
+
+
+def _run_in(context, task):
+    with context():
+        return task()
+
+
+def split_threads(branch_names, total):
+    """
+    Share total intra-op threads between branches in proportion to BRANCH_THREAD_WEIGHTS.
+    Every branch gets at least one thread; leftovers go to the heaviest branches.
+    """
+    weights = {name: BRANCH_THREAD_WEIGHTS.get(name, 1) for name in branch_names}
+    scale = total / sum(weights.values())
+    shares = {name: max(1, int(weight * scale)) for name, weight in weights.items()}
+    for name in sorted(weights, key=weights.get, reverse=True):
+        if sum(shares.values()) >= total:
+            break
+        shares[name] += 1
+    return shares
+
+
+class BranchExecutor:
+    """
+    One single-thread pool per branch, so the branches split the cores between them
+    instead of each trying to use all of them. Each worker calls torch.set_num_threads
+    with its share when it starts; under OpenMP builds the team size it sets is per
+    thread and stays with the worker. torch.set_num_threads also changes process-wide
+    state (the default other threads pick up at their lazy init, the native thread pool,
+    MKL), so the workers are started eagerly and the constructing thread's count is
+    then restored; otherwise the last worker's share (one thread for "freq") would become
+    the default for request handlers, the heatmap batcher and video scans.
+
+    Grad mode and inference mode are thread-local in PyTorch; the caller's modes are
+    re-applied in the worker so no_grad / inference_mode callers stay graph-free and
+    Grad-CAM still gets its graph.
+    """
+
+    def __init__(self, branch_names, total_threads=None):
+        original = torch.get_num_threads()
+        self.threads = split_threads(branch_names, total_threads or original)
+        with _branch_start_lock:
+            try:
+                self.pools = {
+                    name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"branch-{name}",
+                                             initializer=torch.set_num_threads, initargs=(n,))
+                    for name, n in self.threads.items()
+                }
+                # Workers (and their initializers) only start on the first submit
+                for future in [pool.submit(lambda: None) for pool in self.pools.values()]:
+                    future.result()
+            finally:
+                torch.set_num_threads(original)
+
+    def run(self, tasks):
+        """Run {name: callable} concurrently and return {name: result} in the same order"""
+        grad_enabled = torch.is_grad_enabled()
+        inference = torch.is_inference_mode_enabled()
+
+        def call(task):
+            with torch.inference_mode(inference), torch.set_grad_enabled(grad_enabled):
+                return task()
+
+        futures = OrderedDict((name, self.pools[name].submit(call, task)) for name, task in tasks.items())
+        return OrderedDict((name, future.result()) for name, future in futures.items())
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False)
+
+
+# Kept outside the modules: thread pools must not be deep-copied or pickled with the model
+_branch_executors = weakref.WeakKeyDictionary()
+_branch_start_lock = threading.Lock()
+_branch_executors_lock = threading.Lock()
+
+
+def _branch_executor(model):
+    with _branch_executors_lock:
+        executor = _branch_executors.get(model)
+        if executor is None:
+            executor = BranchExecutor(model.branch_names, model.branch_threads)
+            _branch_executors[model] = executor
+        return executor
+
+
+def _drop_branch_executor(model):
+    with _branch_executors_lock:
+        executor = _branch_executors.pop(model, None)
+    if executor is not None:
+        executor.shutdown()
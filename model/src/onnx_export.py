@@ -0,0 +1,111 @@
+import math
+
+import torch
+import torch.nn as nn
+
+from src.config import Config
+
+ONNX_OPSET = 17
+INPUT_NAME = "image"
+
+
+class LogSpectrum(nn.Module):
+    """
+    get_fft_feature written as real matrix products, for export.
+
+    torch.fft has no ONNX lowering in the TorchScript exporter. For a real image x,
+    fft2(x) = F_H x F_W^T with F = C - iS (cosine / sine DFT matrices), so
+
+        Re = C_H x C_W^T - S_H x S_W^T,   Im = -(C_H x S_W^T + S_H x C_W^T)
+
+    The 'ortho' scaling is folded into the matrices, and fftshift is folded in by
+    reordering the frequency rows. Only fixed-size inputs are supported.
+    """
+
+    def __init__(self, height, width):
+        super().__init__()
+        cos_h, sin_h = self._dft(height)
+        cos_w, sin_w = self._dft(width)
+        self.register_buffer("cos_h", cos_h)
+        self.register_buffer("sin_h", sin_h)
+        self.register_buffer("cos_w_t", cos_w.t().contiguous())
+        self.register_buffer("sin_w_t", sin_w.t().contiguous())
+
+    @staticmethod
+    def _dft(n):
+        # Row k of the shifted spectrum is frequency (k - n // 2) mod n
+        freqs = (torch.arange(n, dtype=torch.float64) - n // 2) % n
+        angle = 2 * math.pi * freqs[:, None] * torch.arange(n, dtype=torch.float64)[None, :] / n
+        scale = 1.0 / math.sqrt(n)
+        return (torch.cos(angle) * scale).float(), (torch.sin(angle) * scale).float()
+
+    def forward(self, x):
+        a = torch.matmul(self.cos_h, x)
+        b = torch.matmul(self.sin_h, x)
+        real = torch.matmul(a, self.cos_w_t) - torch.matmul(b, self.sin_w_t)
+        imag = torch.matmul(a, self.sin_w_t) + torch.matmul(b, self.cos_w_t)
+        mag = torch.sqrt(real * real + imag * imag)
+        return torch.log(mag + 1e-6)
+
+
+class ExportableDetector(nn.Module):
+    """
+    DeepfakeDetector forward as a single static graph: every enabled branch, fusion,
+    classifier and (with the patch branch) the per-patch logits of patch_scores.
+    Outputs: logits (B, 1) and patch_logits (B, H_grid, W_grid).
+    """
+
+    def __init__(self, detector, image_size=Config.IMAGE_SIZE):
+        super().__init__()
+        self.detector = detector
+        self.spectrum = LogSpectrum(image_size, image_size)
+
+    def forward(self, x):
+        detector = self.detector
+        feats = {}
+        patch_grid = None
+        if detector.rgb_branch is not None:
+            feats["rgb"] = detector.rgb_branch(x)
+        if detector.freq_branch is not None:
+            feats["freq"] = detector.freq_branch(self.spectrum(x))
+        if detector.patch_branch is not None:
+            feats["patch"], patch_grid = detector.patch_branch.forward_with_patches(x)
+        if detector.vit_branch is not None:
+            feats["vit"] = detector.vit_branch(x)
+
+        combined = detector.fuse(feats)
+        logits = detector.classifier(combined)
+        if patch_grid is None:
+            return logits
+        return logits, detector.patch_scores(combined, patch_grid)
+
+
+def export_onnx(detector, path, image_size=Config.IMAGE_SIZE, opset=ONNX_OPSET):
+    """
+    Export a DeepfakeDetector to ONNX with a dynamic batch axis.
+
+    The branch list and input size are stored in the model metadata, where
+    src.onnx_runtime.OnnxDetector reads them back.
+
+    Returns:
+        list: Output names
+    """
+    import onnx
+
+    wrapper = ExportableDetector(detector.cpu().eval(), image_size).eval()
+    outputs = ["logits"] + (["patch_logits"] if detector.patch_branch is not None else [])
+    example = torch.randn(1, 3, image_size, image_size)
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper, (example,), path,
+            input_names=[INPUT_NAME], output_names=outputs,
+            dynamic_axes={name: {0: "batch"} for name in [INPUT_NAME] + outputs},
+            opset_version=opset, do_constant_folding=True
+        )
+
+    proto = onnx.load(path)
+    for key, value in {"branches": "+".join(detector.branch_names), "image_size": str(image_size)}.items():
+        entry = proto.metadata_props.add()
+        entry.key, entry.value = key, value
+    onnx.save(proto, path)
+    return outputs
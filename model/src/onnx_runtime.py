@@ -0,0 +1,78 @@
+import torch
+
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNXRUNTIME_AVAILABLE = False
+
+# Same name as src.onnx_export.INPUT_NAME; not imported so serving never loads torchvision
+INPUT_NAME = "image"
+
+
+def is_onnx_model(path):
+    return path.endswith(".onnx")
+
+
+class OnnxDetector:
+    """
+    Stand-in for DeepfakeDetector backed by an ONNX Runtime session (CPU execution
+    provider), for models written by export_onnx.py.
+
+    Implements what the serving code calls: model(x, return_patch_map=...),
+    predict_with_patch_map, branch_names. Inputs and outputs are torch tensors on CPU.
+    There is no autograd through the session, so Grad-CAM is unavailable.
+
+    Args:
+        path (str): .onnx file
+        threads (int): ONNX Runtime intra-op threads (default: ONNX Runtime's choice)
+    """
+
+    quantized = False
+    supports_gradcam = False
+    parallel_branches = False
+    branch_threads = None
+    precision = "fp32"
+    supports_precision = False
+
+    def __init__(self, path, threads=None):
+        if not ONNXRUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime is not installed (pip install onnxruntime)")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.branch_names = metadata.get("branches", "").split("+")
+        self.image_size = int(metadata.get("image_size", 0)) or None
+        self.output_names = [output.name for output in self.session.get_outputs()]
+        self.has_patch_map = "patch_logits" in self.output_names
+
+    def __call__(self, x, return_patch_map=False):
+        outputs = self.session.run(self.output_names, {INPUT_NAME: x.detach().cpu().float().numpy()})
+        logits = torch.from_numpy(outputs[0])
+        if not return_patch_map:
+            return logits
+        return logits, torch.from_numpy(outputs[1]) if self.has_patch_map else None
+
+    def predict_with_patch_map(self, x):
+        """Same contract as DeepfakeDetector.predict_with_patch_map"""
+        logits, patch_logits = self(x, return_patch_map=True)
+        if patch_logits is None:
+            return logits, None
+        return logits, torch.sigmoid(patch_logits).numpy()
+
+    def set_precision(self, precision="fp32"):
+        """The exported graph is fp32; other modes would need a re-export"""
+        if precision != "fp32":
+            raise ValueError("ONNX models run in fp32 (set_precision is for eager DeepfakeDetector models)")
+        return self
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
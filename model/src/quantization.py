@@ -0,0 +1,128 @@
+import copy
+import platform
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from src.config import Config
+from src.utils import get_fft_feature
+
+# INT8 models are pickled whole (quantized modules carry their own packed weights and
+# scales), so they are told apart from fp32 checkpoints by file name
+INT8_SUFFIX = ".int8.pth"
+INT8_FORMAT_VERSION = 1
+
+
+def is_int8_checkpoint(path):
+    return path.endswith(INT8_SUFFIX)
+
+
+def select_engine():
+    """x86 (fbgemm) kernels on Intel/AMD, qnnpack on ARM (Apple Silicon, Graviton)"""
+    supported = torch.backends.quantized.supported_engines
+    if platform.machine().lower() in ("arm64", "aarch64") and "qnnpack" in supported:
+        engine = "qnnpack"
+    elif "x86" in supported:
+        engine = "x86"
+    else:
+        engine = "fbgemm"
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def dynamic_linear_names(model):
+    """
+    Linear layers to quantize dynamically: the fusion classifier and the Swin MLP blocks.
+    The Swin attention layers are left in fp32: torchvision's window attention reads
+    qkv.weight / proj.weight directly, which a quantized Linear does not have.
+    """
+    names = {f"classifier.{name}" for name, module in model.classifier.named_children()
+             if isinstance(module, nn.Linear)}
+    if model.vit_branch is not None:
+        for name, module in model.vit_branch.named_modules():
+            if isinstance(module, nn.Linear) and ".mlp." in f".{name}":
+                names.add(f"vit_branch.{name}")
+    return names
+
+
+def static_targets(model):
+    """
+    (owner module, attribute, example input) for every conv stack that gets static
+    post-training quantization. The branches keep their Python forward; only these
+    stacks are swapped for quantized FX graphs (fp32 in, fp32 out).
+    """
+    size = Config.IMAGE_SIZE
+    example = torch.randn(1, 3, size, size)
+    targets = []
+    if model.rgb_branch is not None:
+        targets.append((model.rgb_branch, "features", example))
+    if model.freq_branch is not None:
+        targets.append((model.freq_branch, "net", get_fft_feature(example)))
+    if model.patch_branch is not None:
+        targets.append((model.patch_branch, "patch_encoder", torch.randn(1, 3, 64, 64)))
+    return targets
+
+
+def quantize_detector(model, calibration_batches, engine=None):
+    """
+    INT8 copy of a DeepfakeDetector for CPU inference.
+
+    Args:
+        model (DeepfakeDetector): fp32 model (left untouched)
+        calibration_batches (iterable): (B, C, H, W) input batches used to record the
+            activation ranges of the statically quantized conv stacks
+        engine (str): Quantized backend (default: select_engine())
+
+    Returns:
+        DeepfakeDetector: Quantized model on CPU, in eval mode
+    """
+    engine = engine or select_engine()
+    torch.backends.quantized.engine = engine
+    qmodel = copy.deepcopy(model).cpu().eval()
+    qconfig_mapping = get_default_qconfig_mapping(engine)
+
+    # Static PTQ: insert observers, run the whole model on the calibration set, convert
+    targets = static_targets(qmodel)
+    for owner, attr, example in targets:
+        setattr(owner, attr, prepare_fx(getattr(owner, attr), qconfig_mapping, (example,)))
+    with torch.inference_mode():
+        for batch in calibration_batches:
+            qmodel(batch.cpu())
+    for owner, attr, _ in targets:
+        setattr(owner, attr, convert_fx(getattr(owner, attr)))
+    if qmodel.rgb_branch is not None:
+        # RGBBranch keeps the torchvision model around; point it at the quantized features too
+        qmodel.rgb_branch.net.features = qmodel.rgb_branch.features
+
+    # Dynamic quantization: int8 weights, activations quantized on the fly per batch
+    qmodel = quantize_dynamic(qmodel, dynamic_linear_names(qmodel), dtype=torch.qint8)
+    qmodel.quantized = True
+    return qmodel.eval()
+
+
+def save_quantized(path, qmodel, engine, report=None):
+    torch.save({
+        "format": "int8",
+        "version": INT8_FORMAT_VERSION,
+        "engine": engine,
+        "branches": list(qmodel.branch_names),
+        "model": qmodel,
+        "report": report or {},
+    }, path)
+
+
+def load_quantized(path):
+    """
+    Load a model written by quantize_model.py. INT8 models only run on CPU.
+
+    Returns:
+        tuple: (DeepfakeDetector, saved report dict)
+    """
+    saved = torch.load(path, map_location="cpu", weights_only=False)
+    if saved.get("format") != "int8":
+        raise ValueError(f"{path} is not an INT8 model file")
+    if saved["engine"] in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = saved["engine"]
+    return saved["model"].eval(), saved.get("report", {})
@@ -0,0 +1,41 @@
+import statistics
+import time
+
+import torch
+
+from src.config import Config
+from src.models import DeepfakeDetector
+
+
+def load_detector(checkpoint_path, device="cpu", parallel_branches=None):
+    """
+    DeepfakeDetector with a checkpoint loaded on top of its pretrained weights, in eval mode.
+    Shared by the command-line tools in model/.
+
+    Args:
+        checkpoint_path (str): .safetensors or torch checkpoint (may be a partial save)
+        device (str or torch.device): Device the model is moved to
+        parallel_branches (bool): Passed to DeepfakeDetector (default: Config.PARALLEL_BRANCHES)
+    """
+    model = DeepfakeDetector(pretrained=True, parallel_branches=parallel_branches)
+    if checkpoint_path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        state_dict = load_file(checkpoint_path)
+    else:
+        state_dict = torch.load(checkpoint_path, map_location="cpu")
+    model.load_state_dict(state_dict, strict=False)
+    return model.to(device).eval()
+
+
+def latency_ms(model, iters, warmup=5):
+    """Median and 90th-percentile batch-1 forward latency in milliseconds"""
+    batch = torch.randn(1, 3, Config.IMAGE_SIZE, Config.IMAGE_SIZE)
+    times = []
+    with torch.inference_mode():
+        for i in range(warmup + iters):
+            start = time.perf_counter()
+            model(batch)
+            if i >= warmup:
+                times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(0.9 * (len(times) - 1))]
@@ -0,0 +1,72 @@
+import heapq
+
+
+class DownsampledTimeline:
+    """
+    Fixed-size timeline built online from an unbounded stream of scored frames.
+
+    Frames are grouped into buckets of `width` consecutive samples; each bucket keeps
+    its most suspicious frame (index, prob, thumbnail), so peaks survive downsampling.
+    Whenever more than `max_points` buckets are full, neighbours are merged pairwise and
+    the bucket width doubles, so the timeline never holds more than about max_points
+    entries, whatever the video length.
+    """
+
+    def __init__(self, max_points=240):
+        self.max_points = max(2, max_points)
+        self.width = 1
+        self.points = []   # [frame_index, prob, thumbnail]
+        self._open = None  # Bucket being filled: [frame_index, prob, thumbnail, samples]
+
+    def add(self, index, prob, thumbnail):
+        if self._open is None:
+            self._open = [index, prob, thumbnail, 1]
+        else:
+            self._open[3] += 1
+            if prob > self._open[1]:
+                self._open[:3] = [index, prob, thumbnail]
+
+        if self._open[3] >= self.width:
+            self.points.append(self._open[:3])
+            self._open = None
+            if len(self.points) > self.max_points:
+                self._merge()
+
+    def _merge(self):
+        merged = []
+        for i in range(0, len(self.points), 2):
+            pair = self.points[i:i + 2]
+            merged.append(max(pair, key=lambda p: p[1]))
+        self.points = merged
+        self.width *= 2
+
+    def items(self):
+        """(frame_index, prob, thumbnail) in time order, including the partially filled bucket"""
+        points = list(self.points)
+        if self._open is not None:
+            points.append(self._open[:3])
+        return points
+
+
+class TopKFrames:
+    """The K most suspicious frames seen so far (min-heap on probability)"""
+
+    def __init__(self, k=10, threshold=0.5):
+        self.k = k
+        self.threshold = threshold
+        self.count = 0  # Frames above threshold, including those that fell out of the heap
+        self._heap = []
+
+    def add(self, index, prob, thumbnail):
+        if prob <= self.threshold:
+            return
+        self.count += 1
+        entry = (prob, -index, thumbnail)  # Ties keep the earlier frame
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self):
+        """(frame_index, prob, thumbnail) in time order"""
+        return sorted(((-neg_index, prob, thumb) for prob, neg_index, thumb in self._heap), key=lambda e: e[0])
@@ -3,9 +3,317 @@ import torch
 import numpy as np
 import os
 import base64
+import math
+import shutil
+import threading
 from PIL import Image
+from src.face_tracker import FaceTracker
+from src.video_aggregation import DownsampledTimeline, TopKFrames
+from src.ffmpeg_frames import iter_ffmpeg_frames, probe_video_stream
 
-def process_video(video_path, model, transform, device, frames_per_second=1):
+def iter_sampled_frames(cap, step, strategy="grab", total_frames=0):
+    """
+    Yield (frame_index, bgr_frame) for every `step`-th frame of an open cv2.VideoCapture.
+
+    Strategies:
+        "grab": skipped frames are only grab()bed (demuxed and decoded inside the codec),
+                retrieve() does the pixel conversion and copy for sampled frames only.
+        "seek": jump to each sampled index with CAP_PROP_POS_FRAMES. Can win for very large
+                steps on keyframe-dense files; needs a known frame count, otherwise falls back to "grab".
+        "read": legacy behaviour, every frame is fully read and converted.
+    """
+    if strategy == "seek" and total_frames > 0 and step > 1:
+        for index in range(0, total_frames, step):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield index, frame
+        return
+
+    index = 0
+    while cap.isOpened():
+        if strategy == "read" or index % step == 0:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            if index % step == 0:
+                yield index, frame
+        elif not cap.grab():
+            return
+        index += 1
+
+_cascade_local = threading.local()
+
+def load_face_cascade():
+    """New Haar cascade for face extraction (None if unavailable)"""
+    try:
+        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        cascade = cv2.CascadeClassifier(cascade_path)
+        return None if cascade.empty() else cascade
+    except:
+        return None
+
+def get_face_cascade():
+    """
+    Haar cascade of the calling thread, loaded once per thread.
+    detectMultiScale is not thread-safe (it writes into the classifier's feature
+    evaluator), and face-detect workers and concurrent video jobs run it in parallel.
+    """
+    if not hasattr(_cascade_local, "cascade"):
+        _cascade_local.cascade = load_face_cascade()
+    return _cascade_local.cascade
+
+def make_face_tracker(detect_every=10):
+    """FaceTracker on a cascade of its own (a tracker runs on one thread at a time), or None"""
+    face_cascade = load_face_cascade()
+    return FaceTracker(face_cascade, detect_every=detect_every) if face_cascade else None
+
+def detect_face(frame):
+    """Largest face (x, y, w, h) found by Haar detection on the full-resolution frame, or None"""
+    face_cascade = get_face_cascade()
+    if not face_cascade:
+        return None
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    faces = face_cascade.detectMultiScale(
+        gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60)
+    )
+    if len(faces) == 0:
+        return None
+    # Find largest face
+    return max(faces, key=lambda rect: rect[2] * rect[3])
+
+def prepare_frame(frame, transform, face_box=None, detect=True, return_region=False):
+    """
+    Turn a BGR frame into a model input tensor (C, H, W).
+    Crops the face (with a 20% margin) if one is found, otherwise uses the full frame.
+
+    Args:
+        face_box (tuple): Precomputed (x, y, w, h), e.g. from a FaceTracker.
+        detect (bool): When no face_box is given, run full-resolution Haar detection.
+        return_region (bool): Also return the area fed to the model as (x0, y0, x1, y1)
+                              fractions of the frame size (needed to place patch maps).
+    """
+    # Convert BGR (OpenCV) to RGB
+    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    
+    # --- Face Extraction ---
+    if face_box is None and detect:
+        face_box = detect_face(frame)
+
+    face_crop = None
+    if face_box is not None:
+        x, y, w, h = face_box
+        
+        # Add margin (20%)
+        margin = int(max(w, h) * 0.2)
+        x_start = max(x - margin, 0)
+        y_start = max(y - margin, 0)
+        x_end = min(x + w + margin, frame.shape[1])
+        y_end = min(y + h + margin, frame.shape[0])
+        
+        face_crop = image[y_start:y_end, x_start:x_end]
+    
+    # Use face crop if found, otherwise use full image
+    input_image = face_crop if face_crop is not None else image
+    
+    # Apply transforms
+    tensor = transform(image=input_image)['image']
+    if not return_region:
+        return tensor
+    if face_crop is None:
+        return tensor, (0.0, 0.0, 1.0, 1.0)
+    height, width = frame.shape[:2]
+    return tensor, (x_start / width, y_start / height, x_end / width, y_end / height)
+
+def score_batch(model, tensors, device, with_maps=False):
+    """
+    Run one forward pass over a list of (C, H, W) tensors and return their fake probabilities.
+    With with_maps, returns (probs, patch maps) with one (H_grid, W_grid) map per tensor,
+    taken from the same forward pass (see DeepfakeDetector.predict_with_patch_map).
+    """
+    batch = torch.stack(tensors).to(device)
+    if with_maps:
+        logits, maps = model.predict_with_patch_map(batch)
+        probs = torch.sigmoid(logits).view(-1).tolist()
+        return probs, list(maps) if maps is not None else [None] * len(probs)
+    with torch.no_grad():
+        logits = model(batch)
+        return torch.sigmoid(logits).view(-1).tolist()
+
+def score_prepared(model, pending, device, with_maps=False):
+    """
+    Score a batch of prepared frames.
+
+    Args:
+        pending (list): (frame index, thumbnail image, model input, region) tuples
+    Returns:
+        list of (frame index, thumbnail image, prob, heat); heat is (patch map, region) or None
+    """
+    tensors = [item[2] for item in pending]
+    if with_maps:
+        probs, maps = score_batch(model, tensors, device, with_maps=True)
+        heats = [(patch_map, item[3]) if patch_map is not None else None for patch_map, item in zip(maps, pending)]
+    else:
+        probs = score_batch(model, tensors, device)
+        heats = [None] * len(probs)
+    return [(count, thumb_img, prob, heat) for (count, thumb_img, _, _), prob, heat in zip(pending, probs, heats)]
+
+def encode_thumbnail(thumb_img):
+    """JPEG + base64 encode a small BGR thumbnail"""
+    _, buffer = cv2.imencode('.jpg', thumb_img, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
+    return base64.b64encode(buffer).decode('utf-8')
+
+def overlay_patch_map(thumb_img, patch_map, region):
+    """
+    Blend a patch map over the part of the thumbnail the model looked at.
+
+    Args:
+        thumb_img (np.ndarray): BGR thumbnail of the whole frame
+        patch_map (np.ndarray): (H_grid, W_grid) fake probabilities
+        region (tuple): (x0, y0, x1, y1) fractions of the frame covered by the model input
+    """
+    h, w = thumb_img.shape[:2]
+    x0, y0 = int(region[0] * w), int(region[1] * h)
+    x1, y1 = max(int(round(region[2] * w)), x0 + 1), max(int(round(region[3] * h)), y0 + 1)
+    heat = cv2.resize(patch_map.astype(np.float32), (x1 - x0, y1 - y0))
+    heat = cv2.applyColorMap(np.uint8(255 * np.clip(heat, 0, 1)), cv2.COLORMAP_JET)
+    overlay = thumb_img.copy()
+    overlay[y0:y1, x0:x1] = cv2.addWeighted(overlay[y0:y1, x0:x1], 0.6, heat, 0.4, 0)
+    return overlay
+
+def score_frames(frames, model, transform, device, batch_size=16, tracker=None, patch_maps=False):
+    """
+    Sequential scorer: prepare each sampled frame, score them batch_size at a time.
+    With a FaceTracker, faces are tracked instead of detected on every frame.
+    Yields (frame_index, thumbnail_image, prob, heat) in frame order, where heat is
+    (patch map, model input region) when patch_maps is set, otherwise None.
+    """
+    pending = [] # (frame index, thumbnail image, model input, region) waiting for the next batch
+
+    def flush():
+        try:
+            results = score_prepared(model, pending, device, with_maps=patch_maps)
+        except Exception as e:
+            print(f"Error scoring frames {pending[0][0]}-{pending[-1][0]}: {e}")
+            results = []
+        pending.clear()
+        return results
+
+    for count, frame in frames:
+        # Process this frame
+        try:
+            if tracker is not None:
+                image_tensor, region = prepare_frame(frame, transform, face_box=tracker.locate(frame), detect=False, return_region=True)
+            else:
+                image_tensor, region = prepare_frame(frame, transform, return_region=True)
+            
+            # Generate Thumbnail (Low res); only frames kept in the final output get JPEG-encoded
+            thumb_img = cv2.resize(frame, (160, 90)) # 16:9 thumbnail
+            
+            pending.append((count, thumb_img, image_tensor, region))
+        except Exception as e:
+            print(f"Error processing frame {count}: {e}")
+
+        if len(pending) >= batch_size:
+            yield from flush()
+
+    if pending:
+        yield from flush()
+
+class VideoVerdict:
+    """
+    Running frame statistics plus the video verdict rules, updated one scored frame at a time.
+
+    early_decision() tells when the verdict can be settled before the end of the video:
+      * FAKE is locked for good once a rule holds even if every remaining frame scores 0
+        (a peak above 0.95, or enough fake frames / probability mass already seen).
+      * REAL can never be locked with certainty (one late spike would flip it), so it is
+        accepted once Hoeffding upper bounds on the mean probability and on the fake-frame
+        ratio are below their thresholds at confidence 1 - delta. Frames of a video are
+        correlated, so treat delta as a tuning knob rather than an exact error rate.
+    """
+
+    FAKE_FRAME_THRESHOLD = 0.6 # Stricter frame threshold
+    AVG_THRESHOLD = 0.65
+    RATIO_THRESHOLD = 0.15
+    DENSITY_PEAK = 0.7
+    PEAK_THRESHOLD = 0.95
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.fake_frames = 0
+
+    def update(self, prob):
+        self.count += 1
+        self.total += prob
+        self.max = max(self.max, prob)
+        if prob > self.FAKE_FRAME_THRESHOLD:
+            self.fake_frames += 1
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def fake_ratio(self):
+        return self.fake_frames / self.count if self.count else 0.0
+
+    def is_fake(self):
+        # Verdict Logic (Tuned for High Efficiency Model)
+        # The new model is detecting everything as fake, so we need stricter rules.
+        
+        # 1. Standard Average Check (shifted)
+        cond1 = self.avg > self.AVG_THRESHOLD
+        
+        # 2. Density Check: Require at least 15% of frames to be strictly fake
+        # Was 5%, which is too low for a sensitive model
+        cond2 = self.fake_ratio > self.RATIO_THRESHOLD and self.max > self.DENSITY_PEAK
+        
+        # 3. Peak Check: Only flag single-frame anomalies if EXTREMELY suspicious
+        cond3 = self.max > self.PEAK_THRESHOLD
+        
+        return cond1 or cond2 or cond3
+
+    def confidence(self):
+        # Confidence Calculation
+        if self.is_fake():
+            return max(self.max, 0.6)
+        return 1 - self.avg
+
+    def early_decision(self, remaining, min_frames=60, delta=0.05):
+        """
+        Return (verdict, reason) if scoring can stop now, else None.
+        `remaining` is the number of sampled frames still to come (None if unknown).
+        """
+        if self.count < min_frames:
+            return None
+
+        # FAKE rules that no future frame can undo
+        if self.max > self.PEAK_THRESHOLD:
+            return "FAKE", "peak"
+        if remaining is not None:
+            final_count = self.count + remaining
+            if self.total / final_count > self.AVG_THRESHOLD:
+                return "FAKE", "average"
+            if self.max > self.DENSITY_PEAK and self.fake_frames / final_count > self.RATIO_THRESHOLD:
+                return "FAKE", "density"
+
+        # REAL within a confidence bound
+        if remaining == 0:
+            return None
+        eps = math.sqrt(math.log(1 / delta) / (2 * self.count))
+        if self.avg + eps <= self.AVG_THRESHOLD and self.fake_ratio + eps <= self.RATIO_THRESHOLD:
+            return "REAL", "confidence_bound"
+        return None
+
+def process_video(video_path, model, transform, device, frames_per_second=1, progress_callback=None, cancel_event=None,
+                  sampling="grab", batch_size=16, pipelined=False, face_workers=None,
+                  face_tracking=False, detect_every=10, early_stop=False, early_stop_min_frames=60, early_stop_delta=0.05,
+                  timeline_points=240, top_k=10, frame_source="opencv", decode_width=640, patch_maps=False,
+                  precision=None):
     """
     Process a video file frame-by-frame using the deepfake detection model.
     
@@ -16,12 +324,48 @@ def process_video(video_path, model, transform, device, frames_per_second=1):
         device (torch.device): Device to run inference on.
         frames_per_second (int): Number of frames to sample per second of video. 
                                  Default is 1 to keep processing fast.
+        progress_callback (callable): Optional. Called with a dict for every scored frame
+                                      (frame index, timestamp, probability, progress counters).
+        cancel_event (threading.Event): Optional. When set, decoding stops and an error is returned.
+        sampling (str): Frame sampling strategy, see iter_sampled_frames ("grab", "seek" or "read").
+        batch_size (int): Number of sampled frames (or face crops) scored per forward pass.
+        pipelined (bool): Run decode, face detection and inference as
+                          concurrent stages (see video_pipeline.VideoPipeline).
+        face_workers (int): Face-detection threads in pipelined mode (default: cores - 1, max 4).
+        face_tracking (bool): Detect faces on a downscaled frame every `detect_every` samples and
+                              track them in between (see face_tracker.FaceTracker).
+        detect_every (int): Maximum number of sampled frames between two face detections.
+        early_stop (bool): Stop decoding once the verdict is settled (see VideoVerdict.early_decision).
+                           The rules that depend on the frames still to come are only used
+                           when ffprobe provides the frame count; otherwise the peak rule and
+                           the confidence bound decide alone.
+        early_stop_min_frames (int): Frames to score before an early stop is considered.
+        early_stop_delta (float): Allowed miss probability for an early REAL verdict.
+        timeline_points (int): Maximum timeline length; longer videos are downsampled, keeping
+                               the most suspicious frame of each bucket.
+        top_k (int): Number of most suspicious frames returned in 'suspicious_frames'.
+        frame_source (str): "opencv" decodes with cv2.VideoCapture; "ffmpeg" samples, downscales
+                            and converts frames inside an ffmpeg subprocess (see ffmpeg_frames).
+        decode_width (int): Maximum frame width delivered by the "ffmpeg" source.
+        patch_maps (bool): Keep the forward-pass patch map of each frame and return a heatmap
+                           thumbnail for every suspicious frame (no backward pass needed).
+        precision (str): Switch the model to this inference precision first ("fp32", "bf16",
+                         "channels_last", "bf16+channels_last"; see DeepfakeDetector.set_precision).
+                         The setting stays on the model. None keeps its current precision, and so
+                         do models without supports_precision (INT8, ONNX Runtime).
     
     Returns:
         dict: Aggregated results including verdict, average confidence, and frame-level details.
+              Memory use does not grow with video length: statistics are running values and
+              only the timeline points and top-K frames keep (small) thumbnails.
     """
     if model is None:
         return {"error": "Model not loaded"}
+    if precision is not None and model.precision != precision:
+        if getattr(model, "supports_precision", False):
+            model.set_precision(precision)
+        else:
+            print(f"ℹ️  Precision '{precision}' ignored: this model runs in {model.precision}")
 
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
@@ -39,132 +383,110 @@ def process_video(video_path, model, transform, device, frames_per_second=1):
     step = int(fps / frames_per_second)
     if step < 1: step = 1
 
-    frame_indices = []
-    probs = []
-    
     print(f"Processing video: {video_path}")
     print(f"Duration: {duration:.2f}s, FPS: {fps}, Total Frames: {total_frames}")
     print(f"Sampling every {step} frames...")
 
-    count = 0
     processed_count = 0
     
-    suspicious_frames = [] # Store frames with high fake probability
+    stats = VideoVerdict()
+    timeline = DownsampledTimeline(timeline_points)
+    suspicious = TopKFrames(top_k) # Most suspicious frames (fake prob > 0.5)
+    expected_samples = math.ceil(total_frames / step) if total_frames > 0 else None
+    # Whether expected_samples counts exactly what the frame source yields. Only then can
+    # early stopping rely on the number of frames still to come (VideoVerdict.early_decision).
+    # OpenCV's CAP_PROP_FRAME_COUNT may be estimated from bitrate and duration, so only a
+    # count read or counted by ffprobe qualifies
+    exact_samples = False
+    stopped_early = None
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        if count % step == 0:
-            # Process this frame
-            try:
-                # Convert BGR (OpenCV) to RGB
-                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # --- Face Extraction ---
-                # Load Haar Cascade (lazy load)
-                if not hasattr(process_video, "face_cascade"):
-                    try:
-                        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-                        process_video.face_cascade = cv2.CascadeClassifier(cascade_path)
-                    except:
-                        process_video.face_cascade = None
-
-                face_crop = None
-                if process_video.face_cascade:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = process_video.face_cascade.detectMultiScale(
-                        gray, scaleFactor=1.1, minNeighbors=5, minSize=(60, 60)
-                    )
-                    
-                    if len(faces) > 0:
-                        # Find largest face
-                        largest_face = max(faces, key=lambda rect: rect[2] * rect[3])
-                        x, y, w, h = largest_face
-                        
-                        # Add margin (20%)
-                        margin = int(max(w, h) * 0.2)
-                        x_start = max(x - margin, 0)
-                        y_start = max(y - margin, 0)
-                        x_end = min(x + w + margin, frame.shape[1])
-                        y_end = min(y + h + margin, frame.shape[0])
-                        
-                        face_crop = image[y_start:y_end, x_start:x_end]
-                
-                # Use face crop if found, otherwise use full image
-                input_image = face_crop if face_crop is not None else image
-                
-                # Apply transforms
-                augmented = transform(image=input_image)
-                image_tensor = augmented['image'].unsqueeze(0).to(device)
-                
-                # Inference
-                with torch.no_grad():
-                    logits = model(image_tensor)
-                    prob = torch.sigmoid(logits).item()
-                
-                # Generate Thumbnail (Low res)
-                thumb_img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                thumb_img = cv2.resize(thumb_img, (160, 90)) # 16:9 thumbnail
-                _, buffer = cv2.imencode('.jpg', cv2.cvtColor(thumb_img, cv2.COLOR_RGB2BGR), [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-                thumb_b64 = base64.b64encode(buffer).decode('utf-8')
-                
-                probs.append(prob)
-                frame_indices.append({
-                    "index": count,
-                    "thumbnail": thumb_b64
-                })
-                processed_count += 1
-                
-                # If highly fake, store metadata (timestamp)
-                if prob > 0.5:
-                    timestamp = count / fps
-                    suspicious_frames.append({
-                        "timestamp": round(timestamp, 2),
-                        "frame_index": count,
-                        "fake_prob": round(prob, 4),
-                        "thumbnail": thumb_b64
-                    })
-                    
-            except Exception as e:
-                print(f"Error processing frame {count}: {e}")
-        
-        count += 1
+    if frame_source == "ffmpeg" and shutil.which("ffmpeg") is None:
+        print("ffmpeg not found, falling back to OpenCV decoding")
+        frame_source = "opencv"
+    probe = None
+    if frame_source == "ffmpeg" or early_stop:
+        probe = probe_video_stream(video_path, count_frames=early_stop)
+    if probe is not None and probe['frames'] is not None:
+        # Both sources yield every step-th frame of the stream
+        expected_samples = math.ceil(probe['frames'] / step)
+        exact_samples = True
+    if frame_source == "ffmpeg":
+        # Size as ffmpeg will deliver it (rotation applied); OpenCV's auto-oriented size otherwise
+        if probe is not None:
+            width, height = probe['width'], probe['height']
+        else:
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frames = iter_ffmpeg_frames(video_path, step, width, height, max_width=decode_width)
+    else:
+        frames = iter_sampled_frames(cap, step, strategy=sampling, total_frames=total_frames)
+    tracker = make_face_tracker(detect_every) if face_tracking else None
+    pipeline = None
+    if pipelined:
+        from src.video_pipeline import VideoPipeline
+        pipeline = VideoPipeline(model, transform, device, batch_size=batch_size, face_workers=face_workers,
+                                 tracker=tracker, patch_maps=patch_maps)
+        scored = pipeline.run(frames)
+    else:
+        scored = score_frames(frames, model, transform, device, batch_size, tracker=tracker, patch_maps=patch_maps)
+
+    for count, thumb_img, prob, heat in scored:
+        if cancel_event is not None and cancel_event.is_set():
+            scored.close() # Stops the pipeline threads before the capture is released
+            frames.close()
+            cap.release()
+            return {"error": "Cancelled", "cancelled": True}
+
+        stats.update(prob)
+        timeline.add(count, prob, thumb_img)
+        suspicious.add(count, prob, (thumb_img, heat))
+        processed_count += 1
+
+        if progress_callback is not None:
+            progress_callback({
+                "frame_index": count,
+                "time": round(count / fps, 2),
+                "prob": round(prob, 3),
+                "processed_frames": processed_count,
+                "total_frames": total_frames,
+                "progress": round(min(processed_count / expected_samples, 1.0), 4) if expected_samples else None
+            })
+
+        if early_stop:
+            remaining = None
+            if exact_samples and expected_samples is not None:
+                remaining = max(expected_samples - processed_count, 0)
+            decision = stats.early_decision(remaining, min_frames=early_stop_min_frames, delta=early_stop_delta)
+            if decision is not None:
+                stopped_early = {"timestamp": round(count / fps, 2), "frame_index": count, "reason": decision[1]}
+                print(f"Early stop at {stopped_early['timestamp']}s ({decision[0]}, {decision[1]})")
+                scored.close() # Stop decoding; frames already in flight are dropped
+                break
 
+    if pipeline is not None:
+        print(f"Pipeline stage stats: {pipeline.stats()}")
+    if tracker is not None:
+        print(f"Face tracking stats: {tracker.stats()}")
+    frames.close() # Terminates the ffmpeg process if decoding stopped early
     cap.release()
 
     if processed_count == 0:
         return {"error": "No frames processed"}
 
     # Aggregation
-    avg_prob = sum(probs) / len(probs)
-    max_prob = max(probs)
-    fake_frame_count = len([p for p in probs if p > 0.6]) # Stricter frame threshold
-    fake_ratio = fake_frame_count / processed_count
+    avg_prob = stats.avg
+    max_prob = stats.max
+    fake_ratio = stats.fake_ratio
     
-    # Verdict Logic (Tuned for High Efficiency Model)
-    # The new model is detecting everything as fake, so we need stricter rules.
-    
-    # 1. Standard Average Check (shifted)
-    cond1 = avg_prob > 0.65
-    
-    # 2. Density Check: Require at least 15% of frames to be strictly fake
-    # Was 5%, which is too low for a sensitive model
-    cond2 = fake_ratio > 0.15 and max_prob > 0.7
-    
-    # 3. Peak Check: Only flag single-frame anomalies if EXTREMELY suspicious
-    cond3 = max_prob > 0.95
-    
-    is_fake = cond1 or cond2 or cond3
-    
-    verdict = "FAKE" if is_fake else "REAL"
-    
-    # Confidence Calculation
-    if is_fake:
-        confidence = max(max_prob, 0.6)
-    else:
-        confidence = 1 - avg_prob
+    verdict = "FAKE" if stats.is_fake() else "REAL"
+    confidence = stats.confidence()
+
+    # Thumbnails are encoded only for frames that made it into the output
+    encoded = {}
+    def thumbnail(index, thumb_img):
+        if index not in encoded:
+            encoded[index] = encode_thumbnail(thumb_img)
+        return encoded[index]
     
     return {
         "type": "video",
@@ -177,11 +499,26 @@ def process_video(video_path, model, transform, device, frames_per_second=1):
         "duration": float(duration),
         "timeline": [
             {
-                "time": round(item["index"] / fps, 2), 
+                "time": round(index / fps, 2), 
                 "prob": round(p, 3),
-                "thumbnail": item["thumbnail"]
+                "thumbnail": thumbnail(index, thumb_img)
             } 
-            for item, p in zip(frame_indices, probs)
+            for index, p, thumb_img in timeline.items()
+        ],
+        "timeline_bucket_frames": timeline.width,
+        "suspicious_frames": [ # Top K suspicious moments, in time order
+            {
+                "timestamp": round(index / fps, 2),
+                "frame_index": index,
+                "fake_prob": round(p, 4),
+                "thumbnail": thumbnail(index, thumb_img),
+                "heatmap": encode_thumbnail(overlay_patch_map(thumb_img, *heat)) if heat is not None else None
+            }
+            for index, p, (thumb_img, heat) in suspicious.items()
         ],
-        "suspicious_frames": suspicious_frames[:10] # Top 10 suspicious moments
+        "suspicious_frame_count": suspicious.count,
+        "stage_stats": pipeline.stats() if pipeline is not None else None,
+        "face_tracking": tracker.stats() if tracker is not None else None,
+        "early_stopped": stopped_early is not None,
+        "stopped_at": stopped_early
     }
@@ -0,0 +1,204 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from src.video_inference import prepare_frame, score_prepared
+
+_DONE = object()
+
+
+class StageCounter:
+    """Items handled and busy time of one pipeline stage (thread-safe)"""
+
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items, seconds):
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+
+    def as_dict(self, wall_time):
+        with self._lock:
+            # Throughput this stage could sustain on its own with all of its workers busy
+            capacity = (self.items * self.workers / self.busy) if self.busy > 0 else None
+            return {
+                "items": self.items,
+                "workers": self.workers,
+                "busy_seconds": round(self.busy, 3),
+                "items_per_second": round(capacity, 2) if capacity else None,
+                "utilisation": round(self.busy / (wall_time * self.workers), 3) if wall_time > 0 else None
+            }
+
+
+class VideoPipeline:
+    """
+    Staged video scoring pipeline with bounded queues.
+
+        decoder thread -> face-detection pool -> batching inference thread
+
+    With a FaceTracker the (order-dependent) face tracking runs in the decoder thread,
+    and the pool only crops and preprocesses.
+
+    OpenCV and PyTorch release the GIL, so decode, Haar detection and inference
+    overlap across cores. run() yields (frame_index, thumbnail_image, prob, heat) in
+    frame order (thumbnails are JPEG-encoded later, only for frames kept in the output;
+    heat is (patch map, region) with patch_maps, see score_prepared).
+    stats() reports per-stage throughput so the limiting stage is visible (the one
+    with utilisation close to 1 and the lowest items_per_second).
+    """
+
+    def __init__(self, model, transform, device, batch_size=16, face_workers=None, queue_size=None, tracker=None,
+                 patch_maps=False):
+        self.model = model
+        self.transform = transform
+        self.device = device
+        self.tracker = tracker
+        self.patch_maps = patch_maps
+        self.batch_size = max(1, batch_size)
+        self.face_workers = face_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.queue_size = queue_size or max(self.batch_size * 2, self.face_workers * 4)
+
+        self.counters = {
+            "decode": StageCounter("decode"),
+            "face_track": StageCounter("face_track"),
+            "face_detect": StageCounter("face_detect", self.face_workers),
+            "inference": StageCounter("inference"),
+        }
+        self.error = None
+        self._stop = threading.Event()
+        self._started = None
+        self._finished = None
+
+    def stats(self):
+        end = self._finished or time.perf_counter()
+        wall = (end - self._started) if self._started else 0.0
+        stats = {name: counter.as_dict(wall) for name, counter in self.counters.items()}
+        stats["wall_seconds"] = round(wall, 3)
+        return stats
+
+    def run(self, frames):
+        """
+        Score an iterable of (frame_index, bgr_frame). Generator; closing it stops all stages.
+        """
+        self._started = time.perf_counter()
+        prepared_q = queue.Queue(self.queue_size)
+        out_q = queue.Queue(self.queue_size)
+        pool = ThreadPoolExecutor(max_workers=self.face_workers, thread_name_prefix="face-detect")
+
+        threads = [
+            threading.Thread(target=self._decode_stage, args=(frames, pool, prepared_q), name="video-decode", daemon=True),
+            threading.Thread(target=self._inference_stage, args=(prepared_q, out_q), name="video-inference", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                item = self._get(out_q)
+                if item is _DONE:
+                    break
+                yield item
+            if self.error is not None:
+                raise self.error
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._finished = time.perf_counter()
+
+    # --- Stages ---
+
+    def _decode_stage(self, frames, pool, prepared_q):
+        try:
+            iterator = iter(frames)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                item = next(iterator, None)
+                if item is None:
+                    break
+                count, frame = item
+                # Small copy for the timeline; the full frame only lives until face detection is done
+                thumb_img = cv2.resize(frame, (160, 90)) # 16:9 thumbnail
+                self.counters["decode"].add(1, time.perf_counter() - start)
+
+                face_box = None
+                if self.tracker is not None:
+                    start = time.perf_counter()
+                    face_box = self.tracker.locate(frame)
+                    self.counters["face_track"].add(1, time.perf_counter() - start)
+
+                future = pool.submit(self._face_task, frame, face_box)
+                if not self._put(prepared_q, (count, thumb_img, future)):
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(prepared_q, _DONE)
+
+    def _face_task(self, frame, face_box):
+        start = time.perf_counter()
+        prepared = prepare_frame(frame, self.transform, face_box=face_box, detect=self.tracker is None, return_region=True)
+        self.counters["face_detect"].add(1, time.perf_counter() - start)
+        return prepared
+
+    def _inference_stage(self, prepared_q, out_q):
+        pending = []
+        try:
+            done = False
+            while not done:
+                item = self._get(prepared_q)
+                if item is _DONE:
+                    done = True
+                else:
+                    count, thumb_img, future = item
+                    try:
+                        pending.append((count, thumb_img, *future.result()))
+                    except Exception as e:
+                        print(f"Error processing frame {count}: {e}")
+
+                if pending and (done or len(pending) >= self.batch_size):
+                    start = time.perf_counter()
+                    try:
+                        results = score_prepared(self.model, pending, self.device, with_maps=self.patch_maps)
+                    except Exception as e:
+                        print(f"Error scoring frames {pending[0][0]}-{pending[-1][0]}: {e}")
+                        results = []
+                    self.counters["inference"].add(len(results), time.perf_counter() - start)
+
+                    for result in results:
+                        if not self._put(out_q, result):
+                            return
+                    pending = []
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(out_q, _DONE)
+
+    # --- Queue helpers that give up once the pipeline is stopped ---
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE